@@ -468,6 +468,10 @@ class IntroState(GameState):
         self.parchment_surf = pygame.Surface((self.parchment_w, self.parchment_h))
         self._render_parchment_texture()
 
+        # Rendered once; only its alpha pulses each frame
+        prompt_font = pygame.font.SysFont("arial", 24, bold=True)
+        self.prompt = prompt_font.render("- PRESS START -", True, (80, 40, 0))
+
     def _render_parchment_texture(self):
         self.parchment_surf.fill(PARCHMENT)
         border_margin = 30
@@ -524,8 +528,7 @@ class IntroState(GameState):
     def render(self, screen):
         screen.blit(self.parchment_surf, (0, 0))
         pulse = abs(math.sin(pygame.time.get_ticks() * 0.005)) * 255
-        prompt_font = pygame.font.SysFont("arial", 24, bold=True)
-        prompt = prompt_font.render("- PRESS START -", True, (80, 40, 0))
+        prompt = self.prompt
         prompt.set_alpha(int(pulse))
         
         prompt_x = SCREEN_WIDTH // 2 - prompt.get_width() // 2
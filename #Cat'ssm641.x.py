@@ -3,6 +3,7 @@ import math
 import sys
 import random
 import time
+from collections import OrderedDict
 
 # --- CONSTANTS & CONFIGURATION ---
 SCREEN_WIDTH = 800
@@ -11,6 +12,7 @@ FPS = 60
 TILE_SIZE = 40
 GRAVITY = 0.6
 MAX_FALL_SPEED = 12
+TEXT_CACHE_SIZE = 256  # Rendered text surfaces kept by render_text
 
 # Colors
 BLACK = (0, 0, 0)
@@ -1193,6 +1195,36 @@ def build_level(level_def):
     return tiles, coins, stars, enemies, thwomps, player_start
 
 
+# --- TEXT ---
+
+_fonts = {}
+_text_cache = OrderedDict()
+
+
+def get_font(name, size, bold=False, italic=False):
+    """Process-wide SysFont registry; font lookup can take milliseconds"""
+    key = (name, size, bold, italic)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+        _fonts[key] = font
+    return font
+
+
+def render_text(font, text, color, antialias=True):
+    """font.render through an LRU cache. The surface is shared, so don't draw on it."""
+    key = (font, text, color, antialias)
+    surf = _text_cache.get(key)
+    if surf is None:
+        surf = font.render(text, antialias, color)
+        _text_cache[key] = surf
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return surf
+
+
 # --- HUD ---
 
 def draw_hud(screen, player, level_name):
@@ -1201,7 +1233,7 @@ def draw_hud(screen, player, level_name):
     hud_surf.fill((0, 0, 0, 140))
     screen.blit(hud_surf, (0, 0))
 
-    hud_font = pygame.font.SysFont("arial", 22, bold=True)
+    hud_font = get_font("arial", 22, bold=True)
 
     # Health meter (pie wedges like SM64)
     health_x = 20
@@ -1216,14 +1248,14 @@ def draw_hud(screen, player, level_name):
         pygame.draw.circle(screen, color, (int(ax), int(ay)), 5)
 
     # Coins
-    coin_text = hud_font.render(f"x {player.coins}", True, COIN_GOLD)
+    coin_text = render_text(hud_font, f"x {player.coins}", COIN_GOLD)
     # Mini coin icon
     pygame.draw.ellipse(screen, COIN_GOLD, (80, 12, 16, 20))
     pygame.draw.ellipse(screen, (200, 170, 0), (82, 14, 12, 16))
     screen.blit(coin_text, (100, 12))
 
     # Stars
-    star_text = hud_font.render(f"x {player.stars}", True, STAR_YELLOW)
+    star_text = render_text(hud_font, f"x {player.stars}", STAR_YELLOW)
     # Mini star
     pts = []
     for j in range(10):
@@ -1234,11 +1266,11 @@ def draw_hud(screen, player, level_name):
     screen.blit(star_text, (215, 12))
 
     # Lives
-    lives_text = hud_font.render(f"LIVES: {player.lives}", True, WHITE)
+    lives_text = render_text(hud_font, f"LIVES: {player.lives}", WHITE)
     screen.blit(lives_text, (320, 12))
 
     # Level name
-    name_text = hud_font.render(level_name, True, WHITE)
+    name_text = render_text(hud_font, level_name, WHITE)
     screen.blit(name_text, (SCREEN_WIDTH - name_text.get_width() - 20, 12))
 
 
@@ -1249,12 +1281,12 @@ def draw_star_get_screen(screen, star_timer):
     overlay.fill((255, 255, 200, alpha))
     screen.blit(overlay, (0, 0))
 
-    big_font = pygame.font.SysFont("arial", 64, bold=True)
-    sub_font = pygame.font.SysFont("arial", 32, bold=True)
+    big_font = get_font("arial", 64, bold=True)
+    sub_font = get_font("arial", 32, bold=True)
 
     # Bouncy star text
     bounce = abs(math.sin(star_timer * 0.08)) * 20
-    text = big_font.render("STAR GET!", True, (200, 150, 0))
+    text = render_text(big_font, "STAR GET!", (200, 150, 0))
     screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2,
                        SCREEN_HEIGHT // 2 - 60 - bounce))
 
@@ -1297,15 +1329,17 @@ class IntroState(GameState):
             "Princess Toadstool"
         ]
 
-        self.font = pygame.font.SysFont("georgia", 38, bold=True)
+        self.font = get_font("georgia", 38, bold=True)
         if not self.font:
-            self.font = pygame.font.SysFont("timesnewroman", 38, bold=True)
-        self.sig_font = pygame.font.SysFont("brushscriptmt", 46, italic=True)
+            self.font = get_font("timesnewroman", 38, bold=True)
+        self.sig_font = get_font("brushscriptmt", 46, italic=True)
         if not self.sig_font:
-            self.sig_font = pygame.font.SysFont("arial", 40, bold=True, italic=True)
+            self.sig_font = get_font("arial", 40, bold=True, italic=True)
 
         self.parchment_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self._render_parchment()
+        # Own surface rather than render_text's: its alpha is changed every frame
+        self.prompt = get_font("arial", 24, bold=True).render("- PRESS START -", True, (80, 40, 0))
 
     def _render_parchment(self):
         self.parchment_surf.fill(PARCHMENT)
@@ -1357,8 +1391,7 @@ class IntroState(GameState):
     def render(self, screen):
         screen.blit(self.parchment_surf, (0, 0))
         pulse = abs(math.sin(pygame.time.get_ticks() * 0.005)) * 255
-        pf = pygame.font.SysFont("arial", 24, bold=True)
-        prompt = pf.render("- PRESS START -", True, (80, 40, 0))
+        prompt = self.prompt
         prompt.set_alpha(int(pulse))
         screen.blit(prompt, (SCREEN_WIDTH//2 - prompt.get_width()//2, SCREEN_HEIGHT - 60))
 
@@ -1367,9 +1400,9 @@ class LevelSelectState(GameState):
     """Debug-style level select with all 15 SM64 levels"""
     def __init__(self, manager):
         super().__init__(manager)
-        self.font = pygame.font.SysFont("couriernew", 20, bold=True)
-        self.title_font = pygame.font.SysFont("couriernew", 26, bold=True)
-        self.small_font = pygame.font.SysFont("couriernew", 14)
+        self.font = get_font("couriernew", 20, bold=True)
+        self.title_font = get_font("couriernew", 26, bold=True)
+        self.small_font = get_font("couriernew", 14)
         self.selected = 0
         self.scroll_offset = 0
         self.visible_count = 12
@@ -1400,13 +1433,13 @@ class LevelSelectState(GameState):
         screen.fill(DEBUG_BLUE)
 
         # Header
-        header = self.title_font.render("SUPER MARIO 64 - LEVEL SELECT", True, WHITE)
+        header = render_text(self.title_font, "SUPER MARIO 64 - LEVEL SELECT", WHITE)
         screen.blit(header, (40, 30))
 
-        build = self.small_font.render("BUILD 95-07-29  RSP:OK  RDP:OK  Z-BUF:ON", True, (180, 180, 200))
+        build = render_text(self.small_font, "BUILD 95-07-29  RSP:OK  RDP:OK  Z-BUF:ON", (180, 180, 200))
         screen.blit(build, (40, 60))
 
-        fps_t = self.small_font.render(f"FPS: {int(self.manager.clock.get_fps())}", True, WHITE)
+        fps_t = render_text(self.small_font, f"FPS: {int(self.manager.clock.get_fps())}", WHITE)
         screen.blit(fps_t, (SCREEN_WIDTH - 120, 30))
 
         # Separator
@@ -1426,17 +1459,17 @@ class LevelSelectState(GameState):
                 pygame.draw.rect(screen, (40, 40, 120),
                                (50, y - 2, SCREEN_WIDTH - 100, line_h - 4))
                 # Cursor
-                cursor = self.font.render(">", True, DEBUG_YELLOW)
+                cursor = render_text(self.font, ">", DEBUG_YELLOW)
                 screen.blit(cursor, (55, y + 2))
 
             # Level number
             num_str = f"{i+1:02d}"
-            num = self.font.render(num_str, True, (120, 120, 180))
+            num = render_text(self.font, num_str, (120, 120, 180))
             screen.blit(num, (80, y + 2))
 
             # Level name
             color = DEBUG_YELLOW if is_sel else WHITE
-            name = self.font.render(ldef["name"], True, color)
+            name = render_text(self.font, ldef["name"], color)
             screen.blit(name, (130, y + 2))
 
             # Theme preview (small color swatch)
@@ -1446,10 +1479,10 @@ class LevelSelectState(GameState):
 
         # Scroll indicators
         if self.scroll_offset > 0:
-            up_arrow = self.font.render("^ MORE ^", True, (150, 150, 200))
+            up_arrow = render_text(self.font, "^ MORE ^", (150, 150, 200))
             screen.blit(up_arrow, (SCREEN_WIDTH//2 - up_arrow.get_width()//2, 88))
         if self.scroll_offset + self.visible_count < len(LEVEL_DEFS):
-            dn_arrow = self.font.render("v MORE v", True, (150, 150, 200))
+            dn_arrow = render_text(self.font, "v MORE v", (150, 150, 200))
             screen.blit(dn_arrow, (SCREEN_WIDTH//2 - dn_arrow.get_width()//2,
                                     start_y + self.visible_count * line_h))
 
@@ -1462,11 +1495,11 @@ class LevelSelectState(GameState):
             "IN-GAME: Arrows/WASD=Move  Z=Jump  X=Dive  C=Ground Pound"
         ]
         for j, c in enumerate(controls):
-            ct = self.small_font.render(c, True, (150, 150, 200))
+            ct = render_text(self.small_font, c, (150, 150, 200))
             screen.blit(ct, (40, ctrl_y + j * 20))
 
         # Footer
-        footer = self.small_font.render("CONFIDENTIAL - NINTENDO EAD - NOT FOR DISTRIBUTION", True, (80, 80, 140))
+        footer = render_text(self.small_font, "CONFIDENTIAL - NINTENDO EAD - NOT FOR DISTRIBUTION", (80, 80, 140))
         screen.blit(footer, (40, SCREEN_HEIGHT - 25))
 
 
@@ -1482,7 +1515,7 @@ class GameplayState(GameState):
         self.particles = []
         self.paused = False
         self.pause_selected = 0
-        self.pause_font = pygame.font.SysFont("arial", 36, bold=True)
+        self.pause_font = get_font("arial", 36, bold=True)
         self.complete = False
         self.complete_timer = 0
         self.lava_anim = 0
@@ -1804,7 +1837,7 @@ class GameplayState(GameState):
         overlay.fill((0, 0, 0, 150))
         screen.blit(overlay, (0, 0))
 
-        title = self.pause_font.render("PAUSED", True, WHITE)
+        title = render_text(self.pause_font, "PAUSED", WHITE)
         screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 180))
 
         options = ["CONTINUE", "RESTART", "EXIT TO MENU"]
@@ -1812,7 +1845,7 @@ class GameplayState(GameState):
             is_sel = (i == self.pause_selected)
             color = YELLOW if is_sel else WHITE
             prefix = "> " if is_sel else "  "
-            text = self.pause_font.render(prefix + opt, True, color)
+            text = render_text(self.pause_font, prefix + opt, color)
             screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 260 + i * 50))
 
     def _draw_complete(self, screen):
@@ -1821,16 +1854,16 @@ class GameplayState(GameState):
         overlay.fill((0, 0, 0, alpha))
         screen.blit(overlay, (0, 0))
 
-        big = pygame.font.SysFont("arial", 52, bold=True)
-        sub = pygame.font.SysFont("arial", 28, bold=True)
+        big = get_font("arial", 52, bold=True)
+        sub = get_font("arial", 28, bold=True)
 
-        text = big.render("COURSE CLEAR!", True, STAR_YELLOW)
+        text = render_text(big, "COURSE CLEAR!", STAR_YELLOW)
         screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 200))
 
-        coins_t = sub.render(f"COINS: {self.player.coins}", True, COIN_GOLD)
+        coins_t = render_text(sub, f"COINS: {self.player.coins}", COIN_GOLD)
         screen.blit(coins_t, (SCREEN_WIDTH//2 - coins_t.get_width()//2, 300))
 
-        stars_t = sub.render(f"STARS: {self.player.stars}", True, STAR_YELLOW)
+        stars_t = render_text(sub, f"STARS: {self.player.stars}", STAR_YELLOW)
         screen.blit(stars_t, (SCREEN_WIDTH//2 - stars_t.get_width()//2, 340))
 
 
@@ -1,16 +1,53 @@
 import pygame
+import argparse
 import math
+import mmap
+import os
 import sys
 import random
+import struct
 import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batched enemies and pooled particles need it
+    np = None
 
 # --- CONSTANTS & CONFIGURATION ---
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
-FPS = 60
+FPS = 60  # Simulation rate: update() always advances one 1/FPS step
+SIM_DT = 1.0 / FPS
+RENDER_FPS = 144  # Render cap in live gameplay (0: as fast as the display allows); menus use FPS
+MAX_SUBSTEPS = 5  # Most simulation steps run to catch up in one rendered frame
 TILE_SIZE = 40
 GRAVITY = 0.6
 MAX_FALL_SPEED = 12
+BATCH_ENEMIES = False  # Advance all Goombas in one NumPy step (needs numpy)
+TILE_CHUNK_SIZE = 512  # Pixel size of pre-rendered static tile chunks
+TILE_ANIM_FRAMES = 16  # Frames in the lava, water and sand animation loops
+PALETTE_RENDER = False  # Compose tiles and coins in 8 bits, animated by palette cycling
+ENTITY_CELL_SIZE = 256  # Spatial index cell for draw culling
+CULL_MARGIN = 64  # Draw things this far outside the screen edge
+STREAM_CHUNK_COLS = 32  # Tile columns per streamed level chunk
+STREAM_RADIUS = 1  # Chunks kept live beyond each side of the screen
+# Draw order of entity kinds in the spatial index
+LAYER_COINS, LAYER_STARS, LAYER_ENEMIES, LAYER_THWOMPS = range(4)
+PARTICLE_CAPACITY = 2048
+PARTICLE_ALPHA_STEPS = 16
+TEXT_CACHE_SIZE = 256  # Rendered text surfaces kept by render_text
+DIRTY_MAX_AREA = 0.5  # Flip the whole display once dirty rects cover more than this
+PROFILE_FRAMES = 240  # Frames kept by the F3 profiler overlay
+PROFILE_REFRESH = 15  # Frames between overlay statistics updates
+PROFILE_GRAPH_MAX = 1.0 / 30  # Frame time (s) at the top of the overlay graph
+
+# Everything that affects the simulation draws from SIM_RNG, so a seeded replay
+# reproduces a run exactly. Purely cosmetic render effects use FX_RNG.
+SIM_RNG = random.Random()
+FX_RNG = random.Random()
 
 # Colors
 BLACK = (0, 0, 0)
@@ -413,30 +450,87 @@ LEVEL_DEFS = [
 ]
 
 
+# --- TILE TYPES ---
+# Levels are stored as small integer tile IDs. Each ID indexes TILE_TYPES for its
+# properties; a color of None means the level's own ground/platform color.
+# friction scales the player's deceleration while standing on the tile; every
+# type is 1.0 for now, the baseline's flat deceleration on all surfaces.
+
+TILE_AIR = 0
+TILE_GROUND = 1
+TILE_PLATFORM = 2
+TILE_ICE = 3
+TILE_SAND = 4
+TILE_LAVA = 5
+TILE_WATER = 6
+
+TILE_TYPES = [
+    {"name": "air",      "solid": False, "damage": 0, "friction": 1.0, "color": None},
+    {"name": "ground",   "solid": True,  "damage": 0, "friction": 1.0, "color": None},
+    {"name": "platform", "solid": True,  "damage": 0, "friction": 1.0, "color": None},
+    {"name": "ice",      "solid": True,  "damage": 0, "friction": 1.0, "color": (180, 210, 240)},
+    {"name": "sand",     "solid": True,  "damage": 0, "friction": 1.0, "color": (210, 180, 120)},
+    {"name": "lava",     "solid": True,  "damage": 2, "friction": 1.0, "color": (220, 80, 0)},
+    {"name": "water",    "solid": True,  "damage": 0, "friction": 1.0, "color": (30, 100, 200)},
+]
+
+TILE_CHARS = {
+    'G': TILE_GROUND,
+    'P': TILE_PLATFORM,
+    'I': TILE_ICE,
+    'N': TILE_SAND,
+    'L': TILE_LAVA,
+    'W': TILE_WATER,
+}
+
+TILE_SOLID = bytes(1 if t["solid"] else 0 for t in TILE_TYPES)
+
+
 # --- SPRITE CLASSES ---
 
 class Camera:
     def __init__(self):
         self.x = 0
         self.y = 0
+        self.prev_x = 0
+        self.prev_y = 0
 
     def update(self, target_x, target_y, level_w, level_h):
+        self.prev_x, self.prev_y = self.x, self.y
         self.x = target_x - SCREEN_WIDTH // 2
         self.y = target_y - SCREEN_HEIGHT // 2
         # Clamp
         self.x = max(0, min(self.x, level_w - SCREEN_WIDTH))
         self.y = max(0, min(self.y, level_h - SCREEN_HEIGHT))
 
+    def snap(self, target_x, target_y, level_w, level_h):
+        """Jump to the target with no motion to interpolate from"""
+        self.update(target_x, target_y, level_w, level_h)
+        self.prev_x, self.prev_y = self.x, self.y
+
+    def interpolate(self, source, alpha):
+        """Place this camera between source's last two positions"""
+        self.x = source.prev_x + (source.x - source.prev_x) * alpha
+        self.y = source.prev_y + (source.y - source.prev_y) * alpha
+
+    def view_rect(self, margin=0):
+        """World-space rect of the screen, grown by margin on every side"""
+        return pygame.Rect(self.x - margin, self.y - margin,
+                           SCREEN_WIDTH + 2 * margin, SCREEN_HEIGHT + 2 * margin)
+
 
 class Player:
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.w = 28
         self.h = 38
         self.vx = 0
         self.vy = 0
         self.on_ground = False
+        self.ground_friction = 1.0  # friction of the tile under the feet; 1.0 in the air
         self.facing = 1  # 1=right, -1=left
         self.health = 8
         self.max_health = 8
@@ -487,7 +581,8 @@ class Player:
         self.stars += 1
         self.star_collected_timer = 180
 
-    def update(self, keys, tiles):
+    def update(self, keys, tile_map):
+        self.prev_x, self.prev_y = self.x, self.y
         if self.dead:
             self.vy += GRAVITY
             self.y += self.vy
@@ -503,7 +598,7 @@ class Player:
 
         # --- Input ---
         accel = 0.5
-        decel = 0.3
+        decel = 0.3 * self.ground_friction
         max_speed = 5
         jump_power = -11
         
@@ -547,35 +642,40 @@ class Player:
             self.vy = MAX_FALL_SPEED
 
         # --- Horizontal Movement & Collision ---
+        prev_rect = self.rect
         self.x += self.vx
         player_rect = self.rect
-        for tile in tiles:
-            if player_rect.colliderect(tile["rect"]):
+        for tile_rect, tile_id in tile_map.solid_cells(player_rect.union(prev_rect)):
+            if player_rect.colliderect(tile_rect):
                 if self.vx > 0:
-                    self.x = tile["rect"].left - self.w
+                    self.x = tile_rect.left - self.w
                 elif self.vx < 0:
-                    self.x = tile["rect"].right
+                    self.x = tile_rect.right
                 self.vx = 0
                 player_rect = self.rect
 
         # --- Vertical Movement & Collision ---
+        prev_rect = self.rect
         self.y += self.vy
         self.on_ground = False
+        self.ground_friction = 1.0  # Re-read every step, so it never carries into the air
         player_rect = self.rect
-        for tile in tiles:
-            if player_rect.colliderect(tile["rect"]):
+        for tile_rect, tile_id in tile_map.solid_cells(player_rect.union(prev_rect)):
+            if player_rect.colliderect(tile_rect):
                 if self.vy > 0:
-                    self.y = tile["rect"].top - self.h
+                    self.y = tile_rect.top - self.h
                     self.vy = 0
                     self.on_ground = True
+                    self.ground_friction = TILE_TYPES[tile_id]["friction"]
                     self.is_diving = False
                     self.ground_pound = False
                     # Lava damage
-                    if tile.get("type") == "lava":
-                        self.take_damage(2)
+                    damage = TILE_TYPES[tile_id]["damage"]
+                    if damage:
+                        self.take_damage(damage)
                         self.vy = -12
                 elif self.vy < 0:
-                    self.y = tile["rect"].bottom
+                    self.y = tile_rect.bottom
                     self.vy = 0
                 player_rect = self.rect
 
@@ -625,15 +725,12 @@ class Player:
     def draw(self, screen, cam):
         sx = self.x - cam.x
         sy = self.y - cam.y
+        sprites = player_sprites()
 
         if self.dead:
             # Death animation - spin
-            angle = self.death_timer * 10
-            surf = pygame.Surface((self.w, self.h), pygame.SRCALPHA)
-            # Body red
-            pygame.draw.rect(surf, RED, (4, 8, 20, 22))
-            pygame.draw.ellipse(surf, (255, 200, 150), (6, 0, 16, 16))
-            rotated = pygame.transform.rotate(surf, angle)
+            step = (self.death_timer * 10 // DEATH_SPIN_DEGREES) % len(sprites["death"])
+            rotated = sprites["death"][step]
             screen.blit(rotated, (sx - rotated.get_width()//2 + self.w//2,
                                    sy - rotated.get_height()//2 + self.h//2))
             return
@@ -642,120 +739,170 @@ class Player:
         if self.invincible_timer > 0 and (self.invincible_timer // 4) % 2 == 0:
             return
 
-        # --- Procedural Mario ---
-        # Flip based on facing
-        flip = (self.facing == -1)
-
-        # Create surface
-        surf = pygame.Surface((self.w, self.h), pygame.SRCALPHA)
-
         if self.is_crouching:
-            # Crouching Mario - shorter
-            # Hat
-            pygame.draw.rect(surf, RED, (4, 14, 20, 6))
-            # Face
-            pygame.draw.ellipse(surf, (255, 200, 150), (6, 16, 16, 12))
-            # Eyes
-            ex = 16 if not flip else 10
-            pygame.draw.rect(surf, (0, 0, 80), (ex, 20, 4, 4))
-            # Body
-            pygame.draw.rect(surf, RED, (6, 26, 16, 8))
-            # Legs tucked
-            pygame.draw.rect(surf, (0, 0, 180), (6, 32, 16, 6))
+            pose = "crouch"
         elif self.ground_pound:
-            # Ground pound - butt first
-            pygame.draw.rect(surf, (0, 0, 180), (4, 20, 20, 14))  # Pants
-            pygame.draw.rect(surf, RED, (6, 8, 16, 14))  # Body
-            pygame.draw.ellipse(surf, (255, 200, 150), (8, 0, 12, 12))  # Head
+            pose = "ground_pound"
         elif self.is_diving:
-            # Diving - horizontal
-            pygame.draw.rect(surf, RED, (2, 14, 24, 12))
-            pygame.draw.ellipse(surf, (255, 200, 150), (0 if not flip else 18, 12, 12, 12))
-            pygame.draw.rect(surf, (0, 0, 180), (2, 24, 24, 8))
+            pose = "dive"
+        elif not self.on_ground:
+            pose = "jump"
+        elif self.anim_frame % 2 == 0:
+            pose = "walk0"
         else:
-            # Normal / Walking / Jumping
-            # === Hat ===
-            pygame.draw.rect(surf, RED, (2, 0, 24, 8))
-            hat_brim_x = 0 if not flip else 8
-            pygame.draw.rect(surf, RED, (hat_brim_x, 6, 20, 4))
-
-            # === Face ===
-            pygame.draw.ellipse(surf, (255, 200, 150), (4, 6, 20, 16))
-
-            # === Eyes ===
-            ex = 16 if not flip else 8
-            pygame.draw.rect(surf, (0, 0, 80), (ex, 12, 5, 5))
-            pygame.draw.rect(surf, WHITE, (ex + 1, 12, 2, 2))
-
-            # === Mustache ===
-            mx = 10 if not flip else 8
-            pygame.draw.rect(surf, (80, 40, 10), (mx, 17, 12, 3))
-
-            # === Body / Overalls ===
-            pygame.draw.rect(surf, RED, (4, 20, 20, 6))  # Shirt
-            pygame.draw.rect(surf, (0, 0, 180), (6, 24, 16, 8))  # Overalls
-            # Overall buttons
-            pygame.draw.rect(surf, YELLOW, (9, 25, 3, 3))
-            pygame.draw.rect(surf, YELLOW, (16, 25, 3, 3))
-
-            # === Legs (animated) ===
-            if not self.on_ground:
-                # Jumping pose
-                pygame.draw.rect(surf, (0, 0, 180), (4, 30, 8, 6))
-                pygame.draw.rect(surf, (0, 0, 180), (16, 30, 8, 6))
-                # Shoes
-                pygame.draw.rect(surf, (120, 50, 20), (2, 34, 10, 4))
-                pygame.draw.rect(surf, (120, 50, 20), (16, 34, 10, 4))
-            elif self.anim_frame % 2 == 0:
-                # Stand / walk frame 1
-                pygame.draw.rect(surf, (0, 0, 180), (6, 30, 7, 5))
-                pygame.draw.rect(surf, (0, 0, 180), (15, 30, 7, 5))
-                pygame.draw.rect(surf, (120, 50, 20), (5, 34, 8, 4))
-                pygame.draw.rect(surf, (120, 50, 20), (15, 34, 8, 4))
-            else:
-                # Walk frame 2
-                pygame.draw.rect(surf, (0, 0, 180), (3, 30, 7, 5))
-                pygame.draw.rect(surf, (0, 0, 180), (18, 30, 7, 5))
-                pygame.draw.rect(surf, (120, 50, 20), (2, 34, 8, 4))
-                pygame.draw.rect(surf, (120, 50, 20), (18, 34, 8, 4))
-
-            # === Arms ===
-            if not self.on_ground:
-                # Arms up when jumping
-                pygame.draw.rect(surf, (255, 200, 150), (0, 16, 5, 4))
-                pygame.draw.rect(surf, (255, 200, 150), (23, 16, 5, 4))
-            else:
-                arm_y = 22 + (1 if self.anim_frame % 2 else 0)
-                pygame.draw.rect(surf, (255, 200, 150), (0, arm_y, 5, 6))
-                pygame.draw.rect(surf, (255, 200, 150), (23, arm_y, 5, 6))
-                # Gloves
-                pygame.draw.rect(surf, WHITE, (0, arm_y+4, 5, 3))
-                pygame.draw.rect(surf, WHITE, (23, arm_y+4, 5, 3))
+            pose = "walk1"
+
+        screen.blit(sprites[pose, self.facing == -1], (sx, sy))
+
 
-        if flip:
-            surf = pygame.transform.flip(surf, True, False)
+PLAYER_POSES = ("crouch", "ground_pound", "dive", "jump", "walk0", "walk1")
+DEATH_SPIN_DEGREES = 10  # Death spin is pre-rotated in steps of this many degrees
 
-        screen.blit(surf, (sx, sy))
+_player_sprites = {}
+
+
+def _draw_player_pose(surf, pose, flip):
+    """Procedural Mario for one pose; flip shifts the features mirrored afterwards"""
+    if pose == "crouch":
+        # Crouching Mario - shorter
+        # Hat
+        pygame.draw.rect(surf, RED, (4, 14, 20, 6))
+        # Face
+        pygame.draw.ellipse(surf, (255, 200, 150), (6, 16, 16, 12))
+        # Eyes
+        ex = 16 if not flip else 10
+        pygame.draw.rect(surf, (0, 0, 80), (ex, 20, 4, 4))
+        # Body
+        pygame.draw.rect(surf, RED, (6, 26, 16, 8))
+        # Legs tucked
+        pygame.draw.rect(surf, (0, 0, 180), (6, 32, 16, 6))
+    elif pose == "ground_pound":
+        # Ground pound - butt first
+        pygame.draw.rect(surf, (0, 0, 180), (4, 20, 20, 14))  # Pants
+        pygame.draw.rect(surf, RED, (6, 8, 16, 14))  # Body
+        pygame.draw.ellipse(surf, (255, 200, 150), (8, 0, 12, 12))  # Head
+    elif pose == "dive":
+        # Diving - horizontal
+        pygame.draw.rect(surf, RED, (2, 14, 24, 12))
+        pygame.draw.ellipse(surf, (255, 200, 150), (0 if not flip else 18, 12, 12, 12))
+        pygame.draw.rect(surf, (0, 0, 180), (2, 24, 24, 8))
+    else:
+        # Normal / Walking / Jumping
+        # === Hat ===
+        pygame.draw.rect(surf, RED, (2, 0, 24, 8))
+        hat_brim_x = 0 if not flip else 8
+        pygame.draw.rect(surf, RED, (hat_brim_x, 6, 20, 4))
+
+        # === Face ===
+        pygame.draw.ellipse(surf, (255, 200, 150), (4, 6, 20, 16))
+
+        # === Eyes ===
+        ex = 16 if not flip else 8
+        pygame.draw.rect(surf, (0, 0, 80), (ex, 12, 5, 5))
+        pygame.draw.rect(surf, WHITE, (ex + 1, 12, 2, 2))
+
+        # === Mustache ===
+        mx = 10 if not flip else 8
+        pygame.draw.rect(surf, (80, 40, 10), (mx, 17, 12, 3))
+
+        # === Body / Overalls ===
+        pygame.draw.rect(surf, RED, (4, 20, 20, 6))  # Shirt
+        pygame.draw.rect(surf, (0, 0, 180), (6, 24, 16, 8))  # Overalls
+        # Overall buttons
+        pygame.draw.rect(surf, YELLOW, (9, 25, 3, 3))
+        pygame.draw.rect(surf, YELLOW, (16, 25, 3, 3))
+
+        # === Legs (animated) ===
+        if pose == "jump":
+            # Jumping pose
+            pygame.draw.rect(surf, (0, 0, 180), (4, 30, 8, 6))
+            pygame.draw.rect(surf, (0, 0, 180), (16, 30, 8, 6))
+            # Shoes
+            pygame.draw.rect(surf, (120, 50, 20), (2, 34, 10, 4))
+            pygame.draw.rect(surf, (120, 50, 20), (16, 34, 10, 4))
+        elif pose == "walk0":
+            # Stand / walk frame 1
+            pygame.draw.rect(surf, (0, 0, 180), (6, 30, 7, 5))
+            pygame.draw.rect(surf, (0, 0, 180), (15, 30, 7, 5))
+            pygame.draw.rect(surf, (120, 50, 20), (5, 34, 8, 4))
+            pygame.draw.rect(surf, (120, 50, 20), (15, 34, 8, 4))
+        else:
+            # Walk frame 2
+            pygame.draw.rect(surf, (0, 0, 180), (3, 30, 7, 5))
+            pygame.draw.rect(surf, (0, 0, 180), (18, 30, 7, 5))
+            pygame.draw.rect(surf, (120, 50, 20), (2, 34, 8, 4))
+            pygame.draw.rect(surf, (120, 50, 20), (18, 34, 8, 4))
+
+        # === Arms ===
+        if pose == "jump":
+            # Arms up when jumping
+            pygame.draw.rect(surf, (255, 200, 150), (0, 16, 5, 4))
+            pygame.draw.rect(surf, (255, 200, 150), (23, 16, 5, 4))
+        else:
+            arm_y = 22 + (1 if pose == "walk1" else 0)
+            pygame.draw.rect(surf, (255, 200, 150), (0, arm_y, 5, 6))
+            pygame.draw.rect(surf, (255, 200, 150), (23, arm_y, 5, 6))
+            # Gloves
+            pygame.draw.rect(surf, WHITE, (0, arm_y+4, 5, 3))
+            pygame.draw.rect(surf, WHITE, (23, arm_y+4, 5, 3))
+
+
+
+def player_sprites():
+    """Player pose atlas keyed by (pose, flipped), plus the pre-rotated death spin.
+
+    Baked on first use, once the display exists for convert_alpha.
+    """
+    if not _player_sprites:
+        for pose in PLAYER_POSES:
+            for flip in (False, True):
+                surf = pygame.Surface((28, 38), pygame.SRCALPHA)
+                _draw_player_pose(surf, pose, flip)
+                if flip:
+                    surf = pygame.transform.flip(surf, True, False)
+                _player_sprites[pose, flip] = surf.convert_alpha()
+
+        death = pygame.Surface((28, 38), pygame.SRCALPHA)
+        # Body red
+        pygame.draw.rect(death, RED, (4, 8, 20, 22))
+        pygame.draw.ellipse(death, (255, 200, 150), (6, 0, 16, 16))
+        _player_sprites["death"] = [
+            pygame.transform.rotate(death, angle).convert_alpha()
+            for angle in range(0, 360, DEATH_SPIN_DEGREES)
+        ]
+    return _player_sprites
 
 
 class Coin:
-    def __init__(self, x, y):
+    STATE_SIZE = 4
+    COLORS = (COIN_GOLD, (200, 170, 0), (255, 250, 200))  # Body, rim, shine
+
+    def __init__(self, x, y, anim_timer=None, bob_offset=None):
         self.x = x
         self.y = y
         self.w = 20
         self.h = 24
         self.collected = False
-        self.anim_timer = random.randint(0, 100)
-        self.bob_offset = random.uniform(0, math.pi * 2)
+        self.anim_timer = SIM_RNG.randint(0, 100) if anim_timer is None else anim_timer
+        self.bob_offset = SIM_RNG.uniform(0, math.pi * 2) if bob_offset is None else bob_offset
 
     @property
     def rect(self):
         return pygame.Rect(self.x + 4, self.y, 12, self.h)
 
+    def save_state(self):
+        """Numbers from_state rebuilds this coin from (uncollected coins only)"""
+        return (self.x, self.y, self.anim_timer, self.bob_offset)
+
+    @classmethod
+    def from_state(cls, state):
+        x, y, anim_timer, bob_offset = state
+        return cls(int(x), int(y), int(anim_timer), bob_offset)
+
     def update(self):
         self.anim_timer += 1
 
-    def draw(self, screen, cam):
+    def draw(self, screen, cam, colors=None):
         if self.collected:
             return
         sx = self.x - cam.x
@@ -767,15 +914,18 @@ class Coin:
         cx = sx + (20 - coin_w) // 2
 
         # Coin body
-        pygame.draw.ellipse(screen, COIN_GOLD, (cx, sy, coin_w, 22))
+        body, rim, shine = colors or self.COLORS
+        pygame.draw.ellipse(screen, body, (cx, sy, coin_w, 22))
         if coin_w > 6:
-            pygame.draw.ellipse(screen, (200, 170, 0), (cx + 2, sy + 2, coin_w - 4, 18))
+            pygame.draw.ellipse(screen, rim, (cx + 2, sy + 2, coin_w - 4, 18))
             # Shine
             if coin_w > 10:
-                pygame.draw.ellipse(screen, (255, 250, 200), (cx + coin_w//3, sy + 4, 4, 6))
+                pygame.draw.ellipse(screen, shine, (cx + coin_w//3, sy + 4, 4, 6))
 
 
 class Star:
+    STATE_SIZE = 3
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -789,15 +939,26 @@ class Star:
     def rect(self):
         return pygame.Rect(self.x, self.y, self.w, self.h)
 
+    def save_state(self):
+        """Numbers from_state rebuilds this star from; sparkles are not kept"""
+        return (self.x, self.y, self.anim_timer)
+
+    @classmethod
+    def from_state(cls, state):
+        x, y, anim_timer = state
+        star = cls(int(x), int(y))
+        star.anim_timer = int(anim_timer)
+        return star
+
     def update(self):
         self.anim_timer += 1
         # Sparkle particles
         if self.anim_timer % 10 == 0 and not self.collected:
             self.sparkles.append({
-                "x": self.x + random.randint(-8, 32),
-                "y": self.y + random.randint(-8, 32),
+                "x": self.x + SIM_RNG.randint(-8, 32),
+                "y": self.y + SIM_RNG.randint(-8, 32),
                 "life": 30,
-                "size": random.randint(2, 5)
+                "size": SIM_RNG.randint(2, 5)
             })
         for s in self.sparkles:
             s["life"] -= 1
@@ -812,10 +973,7 @@ class Star:
 
         # Draw sparkles behind
         for s in self.sparkles:
-            alpha = int((s["life"] / 30.0) * 255)
-            spark_surf = pygame.Surface((s["size"]*2, s["size"]*2), pygame.SRCALPHA)
-            pygame.draw.circle(spark_surf, (255, 255, 200, alpha),
-                             (s["size"], s["size"]), s["size"])
+            spark_surf = particle_sprite((255, 255, 200), s["size"], s["life"] / 30.0)
             screen.blit(spark_surf, (s["x"] - cam.x - s["size"],
                                       s["y"] - cam.y - s["size"]))
 
@@ -846,9 +1004,13 @@ class Star:
 
 
 class Goomba:
+    STATE_SIZE = 8
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.w = 30
         self.h = 28
         self.vx = -1.5
@@ -862,7 +1024,8 @@ class Goomba:
     def rect(self):
         return pygame.Rect(self.x, self.y, self.w, self.h)
 
-    def update(self, tiles):
+    def update(self, tile_map):
+        self.prev_x, self.prev_y = self.x, self.y
         if not self.alive:
             self.squish_timer -= 1
             return
@@ -873,29 +1036,31 @@ class Goomba:
             self.vy = MAX_FALL_SPEED
 
         # Horizontal
+        prev = self.rect
         self.x += self.vx
         r = self.rect
-        for t in tiles:
-            if r.colliderect(t["rect"]):
+        for t_rect, _ in tile_map.solid_cells(r.union(prev)):
+            if r.colliderect(t_rect):
                 if self.vx > 0:
-                    self.x = t["rect"].left - self.w
+                    self.x = t_rect.left - self.w
                 elif self.vx < 0:
-                    self.x = t["rect"].right
+                    self.x = t_rect.right
                 self.vx *= -1
                 r = self.rect
 
         # Vertical
+        prev = self.rect
         self.y += self.vy
         self.on_ground = False
         r = self.rect
-        for t in tiles:
-            if r.colliderect(t["rect"]):
+        for t_rect, _ in tile_map.solid_cells(r.union(prev)):
+            if r.colliderect(t_rect):
                 if self.vy > 0:
-                    self.y = t["rect"].top - self.h
+                    self.y = t_rect.top - self.h
                     self.vy = 0
                     self.on_ground = True
                 elif self.vy < 0:
-                    self.y = t["rect"].bottom
+                    self.y = t_rect.bottom
                     self.vy = 0
                 r = self.rect
 
@@ -903,8 +1068,8 @@ class Goomba:
         if self.on_ground:
             edge_check = pygame.Rect(self.x + (self.w if self.vx > 0 else -5), self.y + self.h + 2, 5, 5)
             on_edge = True
-            for t in tiles:
-                if edge_check.colliderect(t["rect"]):
+            for t_rect, _ in tile_map.solid_cells(edge_check):
+                if edge_check.colliderect(t_rect):
                     on_edge = False
                     break
             if on_edge:
@@ -914,6 +1079,22 @@ class Goomba:
         self.alive = False
         self.squish_timer = 30
 
+    def save_state(self):
+        return (self.x, self.y, self.vx, self.vy, self.alive, self.on_ground,
+                self.anim_timer, self.squish_timer)
+
+    @classmethod
+    def from_state(cls, state):
+        x, y, vx, vy, alive, on_ground, anim_timer, squish_timer = state
+        goomba = cls(x, y)
+        goomba.vx = vx
+        goomba.vy = vy
+        goomba.alive = bool(alive)
+        goomba.on_ground = bool(on_ground)
+        goomba.anim_timer = int(anim_timer)
+        goomba.squish_timer = int(squish_timer)
+        return goomba
+
     def draw(self, screen, cam):
         sx = self.x - cam.x
         sy = self.y - cam.y
@@ -950,6 +1131,8 @@ class Goomba:
 
 class Boo:
     """Big Boo's Haunt ghost enemy - chases when you're not looking"""
+    STATE_SIZE = 8
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -961,12 +1144,31 @@ class Boo:
         self.target_alpha = 180
         self.original_x = x
         self.original_y = y
+        self.prev_x = x
+        self.prev_y = y
 
     @property
     def rect(self):
         return pygame.Rect(self.x + 2, self.y + 2, self.w - 4, self.h - 4)
 
+    def save_state(self):
+        return (self.x, self.y, self.alive, self.anim_timer, self.alpha,
+                self.target_alpha, self.original_x, self.original_y)
+
+    @classmethod
+    def from_state(cls, state):
+        x, y, alive, anim_timer, alpha, target_alpha, original_x, original_y = state
+        boo = cls(int(original_x), int(original_y))
+        boo.x = boo.prev_x = x
+        boo.y = boo.prev_y = y
+        boo.alive = bool(alive)
+        boo.anim_timer = int(anim_timer)
+        boo.alpha = int(alpha)
+        boo.target_alpha = int(target_alpha)
+        return boo
+
     def update(self, player_facing, player_x):
+        self.prev_x, self.prev_y = self.x, self.y
         if not self.alive:
             return
         self.anim_timer += 1
@@ -1028,12 +1230,17 @@ class Boo:
 
 class Thwomp:
     """Whomp's Fortress / Tick Tock Clock falling block"""
+    STATE_SIZE = 7
+    STATES = ("wait", "fall", "rise")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
         self.w = TILE_SIZE
         self.h = TILE_SIZE
         self.original_y = y
+        self.prev_x = x
+        self.prev_y = y
         self.state = "wait"  # wait, fall, rise
         self.vy = 0
         self.wait_timer = 60
@@ -1043,7 +1250,23 @@ class Thwomp:
     def rect(self):
         return pygame.Rect(self.x, self.y, self.w, self.h)
 
+    def save_state(self):
+        return (self.x, self.y, self.original_y, self.STATES.index(self.state),
+                self.vy, self.wait_timer, self.alive)
+
+    @classmethod
+    def from_state(cls, state):
+        x, y, original_y, mode, vy, wait_timer, alive = state
+        thwomp = cls(int(x), int(original_y))
+        thwomp.y = thwomp.prev_y = y
+        thwomp.state = cls.STATES[int(mode)]
+        thwomp.vy = vy
+        thwomp.wait_timer = int(wait_timer)
+        thwomp.alive = bool(alive)
+        return thwomp
+
     def update(self, player_x):
+        self.prev_x, self.prev_y = self.x, self.y
         if abs(player_x - self.x) < 80:
             if self.state == "wait":
                 self.wait_timer -= 1
@@ -1090,8 +1313,8 @@ class Particle:
         self.x = x
         self.y = y
         self.color = color
-        self.vx = vel[0] if vel else random.uniform(-2, 2)
-        self.vy = vel[1] if vel else random.uniform(-4, -1)
+        self.vx = vel[0] if vel else SIM_RNG.uniform(-2, 2)
+        self.vy = vel[1] if vel else SIM_RNG.uniform(-4, -1)
         self.life = life
         self.max_life = life
         self.size = size
@@ -1107,101 +1330,1160 @@ class Particle:
             return
         sx = self.x - cam.x
         sy = self.y - cam.y
-        alpha = int((self.life / self.max_life) * 255)
-        s = pygame.Surface((self.size * 2, self.size * 2), pygame.SRCALPHA)
-        pygame.draw.circle(s, (*self.color, alpha), (self.size, self.size), self.size)
+        s = particle_sprite(self.color, self.size, self.life / self.max_life)
         screen.blit(s, (sx - self.size, sy - self.size))
 
 
+_particle_sprites = {}
+
+
+def particle_sprite(color, size, fade):
+    """Pre-rendered circle for (color, size, alpha step); fade runs 0..1"""
+    step = max(0, min(PARTICLE_ALPHA_STEPS - 1, int(fade * (PARTICLE_ALPHA_STEPS - 1))))
+    key = (color, size, step)
+    surf = _particle_sprites.get(key)
+    if surf is None:
+        alpha = int(step * 255 / (PARTICLE_ALPHA_STEPS - 1))
+        surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surf, (*color, alpha), (size, size), size)
+        if pygame.display.get_surface() is not None:
+            surf = surf.convert_alpha()
+        _particle_sprites[key] = surf
+    return surf
+
+
+class ParticleList:
+    """Particle objects in a plain list; used when NumPy is unavailable"""
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def emit(self, x, y, color, vel=None, life=30, size=3):
+        self.items.append(Particle(x, y, color, vel, life, size))
+
+    def update(self):
+        for p in self.items:
+            p.update()
+        self.items = [p for p in self.items if p.life > 0]
+
+    def draw(self, screen, cam):
+        view = cam.view_rect(CULL_MARGIN)
+        for p in self.items:
+            if view.collidepoint(p.x, p.y):
+                p.draw(screen, cam)
+
+
+class ParticlePool:
+    """Fixed-capacity particle storage with one row per live particle.
+
+    Rows hold x, y, vx, vy, life, max_life, r, g, b, size. Live particles are
+    packed at the front; a dead one is replaced by the last live row.
+    """
+    X, Y, VX, VY, LIFE, MAX_LIFE, R, G, B, SIZE = range(10)
+
+    def __init__(self, capacity=PARTICLE_CAPACITY):
+        self.capacity = capacity
+        self.count = 0
+        self.data = np.zeros((capacity, 10), dtype=np.float64)
+
+    def __len__(self):
+        return self.count
+
+    def emit(self, x, y, color, vel=None, life=30, size=3):
+        if self.count >= self.capacity:
+            return  # Pool full: drop rather than grow
+        vx = vel[0] if vel else SIM_RNG.uniform(-2, 2)
+        vy = vel[1] if vel else SIM_RNG.uniform(-4, -1)
+        self.data[self.count] = (x, y, vx, vy, life, life, color[0], color[1], color[2], size)
+        self.count += 1
+
+    def update(self):
+        n = self.count
+        if not n:
+            return
+        d = self.data
+        d[:n, self.X] += d[:n, self.VX]
+        d[:n, self.Y] += d[:n, self.VY]
+        d[:n, self.VY] += 0.1
+        d[:n, self.LIFE] -= 1
+        # Highest index first, so the row swapped in is always still alive
+        for i in np.flatnonzero(d[:n, self.LIFE] <= 0)[::-1]:
+            n -= 1
+            d[i] = d[n]
+        self.count = n
+
+    def draw(self, screen, cam):
+        n = self.count
+        if not n:
+            return
+        d = self.data[:n]
+        view = cam.view_rect(CULL_MARGIN)
+        d = d[(d[:, self.X] >= view.left) & (d[:, self.X] < view.right) &
+              (d[:, self.Y] >= view.top) & (d[:, self.Y] < view.bottom)]
+        size = d[:, self.SIZE].astype(np.int64)
+        xs = (d[:, self.X] - cam.x - size).astype(np.int64).tolist()
+        ys = (d[:, self.Y] - cam.y - size).astype(np.int64).tolist()
+        fades = (d[:, self.LIFE] / d[:, self.MAX_LIFE]).tolist()
+        colors = d[:, self.R:self.SIZE].astype(np.int64).tolist()
+        screen.blits([(particle_sprite(tuple(c), sz, f), (x, y))
+                      for c, sz, f, x, y in zip(colors, size.tolist(), fades, xs, ys)],
+                     doreturn=False)
+
+
+# --- TILE GRID ---
+
+class TileMap:
+    """Dense grid of tile IDs, stored column-major so a level column is contiguous"""
+    def __init__(self, cols, rows, ground_color, plat_color, grid=None):
+        self.cols = cols
+        self.rows = rows
+        self.grid = grid if grid is not None else bytearray(cols * rows)
+        # Resolved color per tile ID for this level
+        self.colors = [t["color"] for t in TILE_TYPES]
+        self.colors[TILE_GROUND] = ground_color
+        self.colors[TILE_PLATFORM] = plat_color
+
+    @property
+    def pixel_width(self):
+        return self.cols * TILE_SIZE
+
+    @property
+    def pixel_height(self):
+        return self.rows * TILE_SIZE
+
+    def tile_at(self, col, row):
+        if 0 <= col < self.cols and 0 <= row < self.rows:
+            return self.grid[col * self.rows + row]
+        return TILE_AIR
+
+    def set_tile(self, col, row, tile_id):
+        self.grid[col * self.rows + row] = tile_id
+
+    def solid_cells(self, rect):
+        """Yield (rect, tile_id) for solid cells overlapping rect, row by row"""
+        c0 = max(0, rect.left // TILE_SIZE)
+        c1 = min(self.cols - 1, (rect.right - 1) // TILE_SIZE)
+        r0 = max(0, rect.top // TILE_SIZE)
+        r1 = min(self.rows - 1, (rect.bottom - 1) // TILE_SIZE)
+        grid = self.grid
+        rows = self.rows
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                tile_id = grid[col * rows + row]
+                if TILE_SOLID[tile_id]:
+                    yield pygame.Rect(col * TILE_SIZE, row * TILE_SIZE, TILE_SIZE, TILE_SIZE), tile_id
+
+
+class StaticTileLayer:
+    """Ground, platform and ice tiles pre-rendered into square chunk surfaces.
+
+    Chunks are baked the first time they come into view and kept for the
+    level, so drawing the static layer costs a few blits however large the
+    map is. Animated tiles (lava, water, sand) are left for the caller to
+    draw on top, listed per chunk so only visible ones are visited.
+    """
+    STATIC_TILES = (TILE_GROUND, TILE_PLATFORM, TILE_ICE)
+    COLORKEY = (255, 0, 255)
+
+    def __init__(self, tile_map, chunk_size=TILE_CHUNK_SIZE):
+        self.tile_map = tile_map
+        self.chunk_size = chunk_size
+        self.chunks = {}  # (chunk_x, chunk_y) -> (surface or None, animated cells)
+        self.fill = tile_map.colors
+        self.ice_shine = (220, 240, 255)
+        # Outline and highlight shades, computed once per tile type
+        self.darker = [tuple(max(0, c - 30) for c in color) if color else None
+                       for color in tile_map.colors]
+        self.lighter = [tuple(min(255, c + 40) for c in color) if color else None
+                        for color in tile_map.colors]
+
+    def _chunk_tiles(self, chunk_x, chunk_y):
+        """Yield (col, row, tile_id) of the solid tiles in and around a chunk"""
+        cs = self.chunk_size
+        tile_map = self.tile_map
+        ox, oy = chunk_x * cs, chunk_y * cs
+        # One extra tile each side: outlines and highlights spill over tile edges
+        c0 = max(0, ox // TILE_SIZE - 1)
+        c1 = min(tile_map.cols - 1, (ox + cs - 1) // TILE_SIZE + 1)
+        r0 = max(0, oy // TILE_SIZE - 1)
+        r1 = min(tile_map.rows - 1, (oy + cs - 1) // TILE_SIZE + 1)
+        for col in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                tile_id = tile_map.tile_at(col, row)
+                if tile_id != TILE_AIR:
+                    yield col, row, tile_id
+
+    def _bake(self, chunk_x, chunk_y):
+        cs = self.chunk_size
+        ox, oy = chunk_x * cs, chunk_y * cs
+        surf = None
+        animated = []
+        for col, row, tile_id in self._chunk_tiles(chunk_x, chunk_y):
+            x = col * TILE_SIZE
+            y = row * TILE_SIZE
+            if tile_id not in self.STATIC_TILES:
+                if ox <= x < ox + cs and oy <= y < oy + cs:
+                    animated.append((col, row, tile_id))
+                continue
+            if surf is None:
+                surf = pygame.Surface((cs, cs))
+                surf.fill(self.COLORKEY)
+            self._draw_tile(surf, tile_id, x - ox, y - oy)
+
+        if surf is not None:
+            surf.set_colorkey(self.COLORKEY, pygame.RLEACCEL)
+            if pygame.display.get_surface() is not None:
+                surf = surf.convert()
+        self.chunks[chunk_x, chunk_y] = (surf, animated)
+        return surf, animated
+
+    def _draw_tile(self, surf, tile_id, sx, sy):
+        r = pygame.Rect(sx, sy, TILE_SIZE, TILE_SIZE)
+        pygame.draw.rect(surf, self.fill[tile_id], r)
+        if tile_id == TILE_ICE:
+            # Ice shine
+            pygame.draw.line(surf, self.ice_shine, (sx + 3, sy + 3), (sx + 15, sy + 15), 1)
+            pygame.draw.line(surf, self.ice_shine, (sx + 20, sy + 5), (sx + 30, sy + 10), 1)
+        else:
+            # Ground/platform detail
+            pygame.draw.rect(surf, self.darker[tile_id], r, 2)
+            # Top highlight
+            pygame.draw.line(surf, self.lighter[tile_id], (sx, sy), (sx + TILE_SIZE, sy), 2)
+
+    def _visible_chunks(self, cam):
+        cs = self.chunk_size
+        max_x = (self.tile_map.pixel_width - 1) // cs
+        max_y = (self.tile_map.pixel_height - 1) // cs
+        x0 = max(0, int(cam.x) // cs)
+        x1 = min(max_x, int(cam.x + SCREEN_WIDTH) // cs)
+        y0 = max(0, int(cam.y) // cs)
+        y1 = min(max_y, int(cam.y + SCREEN_HEIGHT) // cs)
+        for chunk_x in range(x0, x1 + 1):
+            for chunk_y in range(y0, y1 + 1):
+                chunk = self.chunks.get((chunk_x, chunk_y))
+                if chunk is None:
+                    chunk = self._bake(chunk_x, chunk_y)
+                yield chunk_x, chunk_y, chunk
+
+    def draw(self, screen, cam):
+        """Blit visible static chunks and return the on-screen animated cells"""
+        cs = self.chunk_size
+        view = cam.view_rect()
+        c0 = view.left // TILE_SIZE
+        c1 = (view.right - 1) // TILE_SIZE
+        r0 = view.top // TILE_SIZE
+        r1 = (view.bottom - 1) // TILE_SIZE
+        animated = []
+        for chunk_x, chunk_y, (surf, cells) in self._visible_chunks(cam):
+            if surf is not None:
+                screen.blit(surf, (chunk_x * cs - cam.x, chunk_y * cs - cam.y))
+            animated.extend(cell for cell in cells
+                            if c0 <= cell[0] <= c1 and r0 <= cell[1] <= r1)
+        return animated
+
+    def retain(self, left, right):
+        """Drop baked chunks lying entirely outside pixel columns left..right"""
+        cs = self.chunk_size
+        for key in [k for k in self.chunks if (k[0] + 1) * cs <= left or k[0] * cs >= right]:
+            del self.chunks[key]
+
+
+class AnimatedTileAtlas:
+    """Looping animation frames for lava, water and sand, baked once per level.
+
+    A tile shows the frame for its type's phase: the animation clock times
+    the type's speed, plus a per-column (and for sand, per-row) offset, so
+    neighbouring tiles ripple out of step. Drawing is then one blit per tile.
+    """
+    ANIMATED_TILES = (TILE_LAVA, TILE_WATER, TILE_SAND)
+    # Radians of phase per clock tick, per column and per row
+    TIMING = {
+        TILE_LAVA: (0.1, 0.05 * TILE_SIZE, 0.0),
+        TILE_WATER: (0.05, 0.03 * TILE_SIZE, 0.0),
+        TILE_SAND: (math.pi / 32, math.pi * 5 / 8, math.pi * 3 / 8),
+    }
+
+    def __init__(self, colors, frames=TILE_ANIM_FRAMES):
+        self.frames = frames
+        self.surface = pygame.Surface((frames * TILE_SIZE, len(self.ANIMATED_TILES) * TILE_SIZE)).convert()
+        self.areas = {}
+        for i, tile_id in enumerate(self.ANIMATED_TILES):
+            areas = []
+            for k in range(frames):
+                area = pygame.Rect(k * TILE_SIZE, i * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+                angle = 2 * math.pi * (k + 0.5) / frames
+                self._bake(self.surface.subsurface(area), tile_id, colors[tile_id], angle)
+                areas.append(area)
+            self.areas[tile_id] = areas
+
+    @staticmethod
+    def fill_color(tile_id, base, angle):
+        """Base color of a lava or water tile at animation phase angle"""
+        if tile_id == TILE_LAVA:
+            flicker = int(math.sin(angle) * 30)
+            return (min(255, base[0] + flicker), max(0, base[1] + flicker // 2), base[2])
+        wave = int(math.sin(angle) * 10)
+        return (30, max(0, 100 + wave), min(255, 200 + wave))
+
+    @staticmethod
+    def _bake(surf, tile_id, base, angle):
+        if tile_id == TILE_LAVA:
+            surf.fill(AnimatedTileAtlas.fill_color(tile_id, base, angle))
+            # Lava surface shine
+            for _ in range(3):
+                pygame.draw.circle(surf, (255, 200, 50), (FX_RNG.randint(0, TILE_SIZE), 2),
+                                   FX_RNG.randint(1, 3))
+        elif tile_id == TILE_WATER:
+            surf.fill(AnimatedTileAtlas.fill_color(tile_id, base, angle))
+            # Surface ripples
+            pygame.draw.line(surf, (80, 160, 255), (0, 2), (TILE_SIZE, 4), 1)
+        else:
+            surf.fill(base)
+            # Sand dots
+            for _ in range(3):
+                dx = FX_RNG.randint(2, TILE_SIZE - 2)
+                dy = FX_RNG.randint(2, TILE_SIZE - 2)
+                pygame.draw.circle(surf, (190, 160, 100), (dx, dy), 1)
+
+    def draw(self, screen, cells, clock, cam):
+        """Blit the current frame of each (col, row, tile_id) cell"""
+        surface = self.surface
+        areas = self.areas
+        timing = self.TIMING
+        frames = self.frames
+        scale = frames / (2 * math.pi)
+        blits = []
+        for col, row, tile_id in cells:
+            speed, col_phase, row_phase = timing[tile_id]
+            frame = int((clock * speed + col * col_phase + row * row_phase) * scale) % frames
+            blits.append((surface, (col * TILE_SIZE - cam.x, row * TILE_SIZE - cam.y),
+                          areas[tile_id][frame]))
+        screen.blits(blits, doreturn=False)
+
+
+class PaletteTileLayer(StaticTileLayer):
+    """Every tile, plus the coins, composed on one 8-bit palette surface.
+
+    Lava, water and sand are baked into the chunks along with the static
+    tiles, painted with palette entries picked by their animation phase.
+    Each frame only the palette changes: those entries rotate through the
+    AnimatedTileAtlas colors, and a range for coin shine pulses. The world
+    reaches the display in a single blit, converting from 8 bits once.
+    """
+    KEY = 0  # Palette index left transparent
+    COIN_SPEED = 0.08  # Radians of shine pulse per clock tick
+    SAND_DOTS = 6
+
+    def __init__(self, tile_map, frames=TILE_ANIM_FRAMES, chunk_size=TILE_CHUNK_SIZE):
+        super().__init__(tile_map, chunk_size)
+        self.frames = frames
+        self.scale = frames / (2 * math.pi)
+        colors = tile_map.colors
+        palette = [self.COLORKEY]
+        index = {}
+
+        def entry(color):
+            if color not in index:
+                index[color] = len(palette)
+                palette.append(color)
+            return index[color]
+
+        # Fixed entries; the draw code uses these indices in place of colors
+        self.fill = [None] * len(colors)
+        for tile_id in self.STATIC_TILES:
+            self.fill[tile_id] = entry(colors[tile_id])
+            self.darker[tile_id] = entry(self.darker[tile_id])
+            self.lighter[tile_id] = entry(self.lighter[tile_id])
+        self.fill[TILE_SAND] = entry(colors[TILE_SAND])
+        self.ice_shine = entry(self.ice_shine)
+        self.lava_shine = entry((255, 200, 50))
+        self.ripple = entry((80, 160, 255))
+        body, rim, shine = Coin.COLORS
+        self.coin_body = entry(body)
+        self.coin_rim = entry(rim)
+
+        # Cycled ranges: (first index, color per frame, radians per tick)
+        angles = [2 * math.pi * (k + 0.5) / frames for k in range(frames)]
+        self.cycles = {}
+        for tile_id in AnimatedTileAtlas.ANIMATED_TILES:
+            if tile_id == TILE_SAND:
+                # Dots show for half the loop, so they twinkle in and out
+                ring = [(190, 160, 100) if math.sin(a) > 0 else colors[TILE_SAND] for a in angles]
+            else:
+                ring = [AnimatedTileAtlas.fill_color(tile_id, colors[tile_id], a) for a in angles]
+            self.cycles[tile_id] = (len(palette), ring, AnimatedTileAtlas.TIMING[tile_id][0])
+            palette.extend(ring)
+        ring = [tuple(int(r + (s - r) * (1 + math.sin(a)) / 2) for r, s in zip(rim, shine))
+                for a in angles]
+        self.cycles[Coin] = (len(palette), ring, self.COIN_SPEED)
+        palette.extend(ring)
+
+        self.palette = palette
+        self.surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), 0, 8)
+        self.surface.set_palette(palette)
+        self.surface.set_colorkey(self.KEY)
+
+    def _new_chunk(self):
+        surf = pygame.Surface((self.chunk_size, self.chunk_size), 0, 8)
+        surf.set_palette(self.palette)
+        surf.fill(self.KEY)
+        surf.set_colorkey(self.KEY)
+        return surf
+
+    def _bake(self, chunk_x, chunk_y):
+        cs = self.chunk_size
+        ox, oy = chunk_x * cs, chunk_y * cs
+        surf = None
+        animated = []
+        for col, row, tile_id in self._chunk_tiles(chunk_x, chunk_y):
+            if surf is None:
+                surf = self._new_chunk()
+            if tile_id in self.STATIC_TILES:
+                self._draw_tile(surf, tile_id, col * TILE_SIZE - ox, row * TILE_SIZE - oy)
+            else:
+                animated.append((col, row, tile_id))
+        # Animated tiles go on top of the static ones, as the atlas draws them
+        for col, row, tile_id in animated:
+            self._draw_animated(surf, col, row, tile_id, col * TILE_SIZE - ox, row * TILE_SIZE - oy)
+        self.chunks[chunk_x, chunk_y] = (surf, ())
+        return surf, ()
+
+    def _phase(self, tile_id, col, row):
+        """Palette entry of a cycled range for a tile at col, row"""
+        first = self.cycles[tile_id][0]
+        _, col_phase, row_phase = AnimatedTileAtlas.TIMING[tile_id]
+        return first + int((col * col_phase + row * row_phase) * self.scale) % self.frames
+
+    def _draw_animated(self, surf, col, row, tile_id, sx, sy):
+        r = pygame.Rect(sx, sy, TILE_SIZE, TILE_SIZE)
+        # Seeded per tile, so a tile spilling into a neighbour chunk matches
+        rng = random.Random(col * self.tile_map.rows + row)
+        if tile_id == TILE_LAVA:
+            pygame.draw.rect(surf, self._phase(tile_id, col, row), r)
+            for _ in range(3):
+                pygame.draw.circle(surf, self.lava_shine, (sx + rng.randint(0, TILE_SIZE), sy + 2),
+                                   rng.randint(1, 3))
+        elif tile_id == TILE_WATER:
+            pygame.draw.rect(surf, self._phase(tile_id, col, row), r)
+            pygame.draw.line(surf, self.ripple, (sx, sy + 2), (sx + TILE_SIZE, sy + 4), 1)
+        else:
+            pygame.draw.rect(surf, self.fill[TILE_SAND], r)
+            first = self.cycles[TILE_SAND][0]
+            phase = self._phase(tile_id, col, row) - first
+            for i in range(self.SAND_DOTS):
+                dx = rng.randint(2, TILE_SIZE - 2)
+                dy = rng.randint(2, TILE_SIZE - 2)
+                k = (phase + i * self.frames // self.SAND_DOTS) % self.frames
+                pygame.draw.circle(surf, first + k, (sx + dx, sy + dy), 1)
+
+    def coin_colors(self, coin):
+        """Palette indices to pass to Coin.draw, shine pulsing out of step per coin"""
+        first = self.cycles[Coin][0]
+        return (self.coin_body, self.coin_rim,
+                first + int(coin.bob_offset * self.scale) % self.frames)
+
+    def compose(self, cam):
+        """Clear the 8-bit surface and blit the visible chunks; coins go on next"""
+        surface = self.surface
+        # Chunks share the base palette, so blitting them copies indices as-is
+        surface.set_palette(self.palette)
+        surface.fill(self.KEY)
+        self.draw(surface, cam)
+        return surface
+
+    def present(self, screen, clock):
+        """Rotate the cycled ranges for this tick and convert onto the screen"""
+        palette = self.palette[:]
+        for first, ring, speed in self.cycles.values():
+            shift = int(clock * speed * self.scale) % self.frames
+            palette[first:first + self.frames] = ring[shift:] + ring[:shift]
+        self.surface.set_palette(palette)
+        screen.blit(self.surface, (0, 0))
+
+
+# --- BATCHED ENEMIES ---
+
+class GoombaView(Goomba):
+    """A Goomba whose state lives in a GoombaBatch row"""
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+        self.w = batch.w
+        self.h = batch.h
+
+    def _field(name, cast):
+        def fget(self):
+            return cast(getattr(self.batch, name)[self.index])
+        def fset(self, value):
+            getattr(self.batch, name)[self.index] = value
+        return property(fget, fset)
+
+    x = _field("x", float)
+    y = _field("y", float)
+    prev_x = _field("prev_x", float)
+    prev_y = _field("prev_y", float)
+    vx = _field("vx", float)
+    vy = _field("vy", float)
+    alive = _field("alive", bool)
+    on_ground = _field("on_ground", bool)
+    anim_timer = _field("anim_timer", int)
+    squish_timer = _field("squish_timer", int)
+    del _field
+
+    def update(self, tile_map):
+        pass  # Advanced by GoombaBatch.update
+
+
+class GoombaBatch:
+    """Struct-of-arrays state for every Goomba in a level, stepped in one go.
+
+    Mirrors Goomba.update: gravity, axis-separated tile collision and turning
+    at ledges, evaluated for all walkers at once against the level's solid mask.
+    """
+    def __init__(self, goombas, tile_map, solid=None):
+        self.w = goombas[0].w if goombas else 30
+        self.h = goombas[0].h if goombas else 28
+        self.x = np.array([g.x for g in goombas], dtype=np.float64)
+        self.y = np.array([g.y for g in goombas], dtype=np.float64)
+        self.prev_x = self.x.copy()
+        self.prev_y = self.y.copy()
+        self.vx = np.array([g.vx for g in goombas], dtype=np.float64)
+        self.vy = np.array([g.vy for g in goombas], dtype=np.float64)
+        self.alive = np.array([g.alive for g in goombas], dtype=bool)
+        self.on_ground = np.array([g.on_ground for g in goombas], dtype=bool)
+        self.anim_timer = np.array([g.anim_timer for g in goombas], dtype=np.int64)
+        self.squish_timer = np.array([g.squish_timer for g in goombas], dtype=np.int64)
+        self.views = [GoombaView(self, i) for i in range(len(goombas))]
+        self._last_cells = None
+
+        if solid is None:
+            grid = np.frombuffer(tile_map.grid, dtype=np.uint8).reshape(tile_map.cols, tile_map.rows)
+            solid = np.frombuffer(TILE_SOLID, dtype=np.uint8)[grid].astype(bool)
+        self.solid = solid  # Shared by batches rebuilt for the same level
+
+    def _solid_at(self, px, py):
+        """Solid flag of the tiles containing integer pixel coordinates"""
+        col = px // TILE_SIZE
+        row = py // TILE_SIZE
+        cols, rows = self.solid.shape
+        inside = (col >= 0) & (col < cols) & (row >= 0) & (row < rows)
+        return self.solid[np.clip(col, 0, cols - 1), np.clip(row, 0, rows - 1)] & inside
+
+    def update(self):
+        if not len(self.x):
+            return
+        w, h = self.w, self.h
+        self.prev_x[:] = self.x
+        self.prev_y[:] = self.y
+        alive = self.alive
+        self.squish_timer[~alive] -= 1
+        self.anim_timer[alive] += 1
+        self.vy[alive] = np.minimum(self.vy[alive] + GRAVITY, MAX_FALL_SPEED)
+
+        # Horizontal: only the leading column can start overlapping a tile
+        x = self.x
+        x[alive] += self.vx[alive]
+        ix = np.trunc(x).astype(np.int64)
+        iy = np.trunc(self.y).astype(np.int64)
+        right = self.vx > 0
+        lead = np.where(right, ix + w - 1, ix)
+        hit = alive & (self._solid_at(lead, iy) | self._solid_at(lead, iy + h - 1))
+        lead_col = lead // TILE_SIZE
+        x[:] = np.where(hit & right, lead_col * TILE_SIZE - w, x)
+        x[:] = np.where(hit & ~right, (lead_col + 1) * TILE_SIZE, x)
+        self.vx[hit] *= -1
+
+        # Vertical
+        y = self.y
+        y[alive] += self.vy[alive]
+        self.on_ground[alive] = False
+        ix = np.trunc(x).astype(np.int64)
+        iy = np.trunc(y).astype(np.int64)
+        down = self.vy > 0
+        lead = np.where(down, iy + h - 1, iy)
+        hit = alive & (self._solid_at(ix, lead) | self._solid_at(ix + w - 1, lead))
+        lead_row = lead // TILE_SIZE
+        y[:] = np.where(hit & down, lead_row * TILE_SIZE - h, y)
+        y[:] = np.where(hit & ~down, (lead_row + 1) * TILE_SIZE, y)
+        self.on_ground[hit & down] = True
+        self.vy[hit] = 0
+
+        # Turn at edges: probe a 5x5 box just past the leading foot
+        grounded = alive & self.on_ground
+        if grounded.any():
+            right = self.vx > 0
+            px = np.trunc(np.where(right, x + w, x - 5)).astype(np.int64)
+            py = np.trunc(y + h + 2).astype(np.int64)
+            support = (self._solid_at(px, py) | self._solid_at(px + 4, py) |
+                       self._solid_at(px, py + 4) | self._solid_at(px + 4, py + 4))
+            self.vx[grounded & ~support] *= -1
+
+    def moved_cells(self, cell_size):
+        """Views whose spatial-index cell changed since the last call"""
+        cells = (np.floor_divide(self.x, cell_size).astype(np.int64) * 65536 +
+                 np.floor_divide(self.y, cell_size).astype(np.int64))
+        last = self._last_cells
+        self._last_cells = cells
+        if last is None:
+            return list(self.views)
+        return [self.views[i] for i in np.flatnonzero(cells != last)]
+
+    def touching(self, rect):
+        """Live and squished Goombas whose rect overlaps rect"""
+        ix = np.trunc(self.x)
+        iy = np.trunc(self.y)
+        mask = ((ix < rect.right) & (ix + self.w > rect.left) &
+                (iy < rect.bottom) & (iy + self.h > rect.top))
+        return [self.views[i] for i in np.flatnonzero(mask)]
+
+
+# --- SPATIAL INDEX ---
+
+class SpatialHash:
+    """Uniform grid of entity buckets keyed by each entity's top-left cell.
+
+    Entities must be smaller than a cell. Queries return items by layer,
+    then in insertion order, so draw layering matches the order they were
+    added.
+    """
+    def __init__(self, cell_size=ENTITY_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.keys = {}
+        self.order = {}
+        self.inserted = 0
+
+    def _key(self, item):
+        return int(item.x // self.cell_size), int(item.y // self.cell_size)
+
+    def _discard(self, key, item):
+        bucket = self.cells[key]
+        bucket.discard(item)
+        if not bucket:
+            del self.cells[key]
+
+    def insert(self, item, layer=0):
+        key = self._key(item)
+        self.order[item] = (layer, self.inserted)
+        self.inserted += 1
+        self.keys[item] = key
+        self.cells.setdefault(key, set()).add(item)
+
+    def remove(self, item):
+        key = self.keys.pop(item, None)
+        if key is not None:
+            self._discard(key, item)
+            del self.order[item]
+
+    def move(self, item):
+        """Re-bucket item after it moved; cheap when it stayed in its cell"""
+        key = self._key(item)
+        old = self.keys.get(item)
+        if old != key and old is not None:
+            self._discard(old, item)
+            self.cells.setdefault(key, set()).add(item)
+            self.keys[item] = key
+
+    def query(self, rect):
+        """Items whose cell overlaps rect (widened by a cell up and left)"""
+        cs = self.cell_size
+        found = []
+        for cx in range((rect.left - cs) // cs, rect.right // cs + 1):
+            for cy in range((rect.top - cs) // cs, rect.bottom // cs + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        found.sort(key=self.order.__getitem__)
+        return found
+
+
+# --- BACKGROUNDS ---
+
+class ParallaxLayer:
+    """A horizontally tileable strip that scrolls at factor times the camera speed"""
+    def __init__(self, surface, y, factor=0.0, x_offset=0):
+        self.surface = surface
+        self.y = y
+        self.factor = factor
+        self.x_offset = x_offset
+
+    def draw(self, screen, cam_x):
+        period = self.surface.get_width()
+        x = self.x_offset - int(cam_x * self.factor) % period
+        while x < SCREEN_WIDTH:
+            screen.blit(self.surface, (x, self.y))
+            x += period
+
+
+def _strip(width, height, draw, xs=(0,)):
+    """Colorkeyed layer surface painted by draw(surf, x) for each x in xs.
+
+    Each x is painted again one width to the left, so shapes crossing the
+    right edge continue at the left and the strip tiles seamlessly.
+    """
+    surf = pygame.Surface((width, height)).convert()
+    surf.fill(StaticTileLayer.COLORKEY)
+    for x in xs:
+        draw(surf, x % width)
+        draw(surf, x % width - width)
+    # RLE makes blitting a mostly transparent strip far cheaper than drawing it
+    surf.set_colorkey(StaticTileLayer.COLORKEY, pygame.RLEACCEL)
+    return surf
+
+
+def build_backdrop(level_def):
+    """Pre-rendered background layers for a level's theme, drawn behind the tiles"""
+    theme = level_def["music_hint"]
+    if theme == "grass":
+        # Distant hills
+        color = tuple(min(255, c + 30) for c in level_def["sky"])
+        hills = _strip(SCREEN_WIDTH + 200, 150,
+                       lambda surf, x: pygame.draw.ellipse(surf, color, (x, 0, 300, 150)),
+                       range(0, 1250, 250))
+        return [ParallaxLayer(hills, SCREEN_HEIGHT - 200, 0.2, -100)]
+
+    if theme == "cave":
+        # Stalactites
+        spikes = _strip(SCREEN_WIDTH + 60, 61,
+                        lambda surf, x: pygame.draw.polygon(
+                            surf, (50, 40, 35), [(x, 0), (x + 15, 60), (x + 30, 0)]),
+                        range(0, 960, 120))
+        return [ParallaxLayer(spikes, 0, 0.1, -30)]
+
+    if theme == "desert":
+        # Distant pyramids
+        pyramids = _strip(SCREEN_WIDTH + 200, 101,
+                          lambda surf, x: pygame.draw.polygon(
+                              surf, (200, 170, 100), [(x, 100), (x + 60, 0), (x + 120, 100)]),
+                          range(0, 1050, 350))
+        return [ParallaxLayer(pyramids, SCREEN_HEIGHT - 250, 0.15, -100)]
+
+    if theme == "sky":
+        # Rainbow stripes
+        rainbow_colors = [(255, 0, 0), (255, 127, 0), (255, 255, 0),
+                          (0, 255, 0), (0, 0, 255), (75, 0, 130), (148, 0, 211)]
+        stripes = pygame.Surface((SCREEN_WIDTH, len(rainbow_colors) * 15), pygame.SRCALPHA)
+        for i, rc in enumerate(rainbow_colors):
+            stripes.fill((*rc, 40), (0, i * 15, SCREEN_WIDTH, 12))
+        return [ParallaxLayer(stripes, 50)]
+
+    if theme == "fortress":
+        # Brick pattern overlay
+        def bricks(surf, x):
+            for row in range(0, SCREEN_HEIGHT, 40):
+                offset = 20 if (row // 40) % 2 else 0
+                for col in range(-20 + offset, SCREEN_WIDTH + 20, 40):
+                    pygame.draw.rect(surf, (0, 0, 0), (x + col, row, 38, 18), 1)
+        return [ParallaxLayer(_strip(SCREEN_WIDTH, SCREEN_HEIGHT, bricks), 0)]
+
+    return []
+
+
 # --- LEVEL BUILDER ---
 
+# Map characters that spawn an entity: class and its offset inside the tile
+ENTITY_CHARS = {
+    'C': (Coin, 10, 8),
+    'S': (Star, 4, 4),
+    'E': (Goomba, 0, -28),
+    'B': (Boo, 0, 0),
+    'T': (Thwomp, 0, 0),
+}
+
+
+class LevelTemplate:
+    """The parts of a parsed level that never change during play.
+
+    The tile map (and its baked tile layer) is shared by every run of the
+    level; instantiate() builds fresh coins, stars and enemies from the
+    spawn list.
+    """
+    def __init__(self, level_def, tile_map, spawns, player_start):
+        self.level_def = level_def
+        self.tile_map = tile_map
+        self.spawns = spawns  # (map char, x, y) in map order
+        self.star_count = sum(1 for spawn in spawns if spawn[0] == 'S')
+        self.player_start = player_start
+        self.tile_layer = StaticTileLayer(tile_map)
+        self.backdrop = None  # ParallaxLayers, built when first drawn
+        self.tile_atlas = None  # AnimatedTileAtlas, likewise
+        self.palette_layer = None  # PaletteTileLayer, with PALETTE_RENDER on
+        self._chunk_spawns = {}
+
+    def instantiate(self, spawns=None):
+        """New coins, stars, enemies and thwomps at spawns (default: all of them)"""
+        coins = []
+        stars = []
+        enemies = []
+        thwomps = []
+        lists = {'C': coins, 'S': stars, 'E': enemies, 'B': enemies, 'T': thwomps}
+        for char, x, y in self.spawns if spawns is None else spawns:
+            lists[char].append(ENTITY_CHARS[char][0](x, y))
+        return coins, stars, enemies, thwomps
+
+    def chunk_spawns(self, chunk_cols):
+        """Spawn list split into chunk_cols-wide column chunks"""
+        chunks = self._chunk_spawns.get(chunk_cols)
+        if chunks is None:
+            chunk_px = chunk_cols * TILE_SIZE
+            chunks = [[] for _ in range((self.tile_map.cols - 1) // chunk_cols + 1)]
+            for spawn in self.spawns:
+                chunks[spawn[1] // chunk_px].append(spawn)
+            self._chunk_spawns[chunk_cols] = chunks
+        return chunks
+
+
 def build_level(level_def):
-    """Parse a level map into game objects"""
-    tiles = []
-    coins = []
-    stars = []
-    enemies = []
-    thwomps = []
+    """Parse a level map into a LevelTemplate"""
+    spawns = []
     player_start = (100, 400)
 
-    tile_map = level_def["map"]
-    ground_color = level_def["ground_color"]
-    plat_color = level_def["plat_color"]
+    map_rows = level_def["map"]
+    tile_map = TileMap(max(len(row) for row in map_rows), len(map_rows),
+                       level_def["ground_color"], level_def["plat_color"])
 
-    for row_i, row in enumerate(tile_map):
+    for row_i, row in enumerate(map_rows):
         for col_i, cell in enumerate(row):
-            x = col_i * TILE_SIZE
-            y = row_i * TILE_SIZE
-
-            if cell == 'G':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": ground_color,
-                    "type": "ground"
-                })
-            elif cell == 'P':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": plat_color,
-                    "type": "platform"
-                })
-            elif cell == 'I':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": (180, 210, 240),
-                    "type": "ice"
-                })
-            elif cell == 'N':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": (210, 180, 120),
-                    "type": "sand"
-                })
-            elif cell == 'L':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": (220, 80, 0),
-                    "type": "lava"
-                })
-            elif cell == 'W':
-                tiles.append({
-                    "rect": pygame.Rect(x, y, TILE_SIZE, TILE_SIZE),
-                    "color": (30, 100, 200),
-                    "type": "water"
-                })
-            elif cell == 'C':
-                coins.append(Coin(x + 10, y + 8))
-            elif cell == 'S':
-                stars.append(Star(x + 4, y + 4))
-            elif cell == 'E':
-                enemies.append(Goomba(x, y - 28))
-            elif cell == 'B':
-                enemies.append(Boo(x, y))
-            elif cell == 'T':
-                thwomps.append(Thwomp(x, y))
+            tile_id = TILE_CHARS.get(cell)
+            if tile_id is not None:
+                tile_map.set_tile(col_i, row_i, tile_id)
+            elif cell in ENTITY_CHARS:
+                _, dx, dy = ENTITY_CHARS[cell]
+                spawns.append((cell, col_i * TILE_SIZE + dx, row_i * TILE_SIZE + dy))
 
     # Find a good starting position (leftmost ground tile area)
-    for row_i in range(len(tile_map) - 2, -1, -1):
-        for col_i in range(len(tile_map[row_i])):
-            if tile_map[row_i][col_i] == '.' and row_i + 1 < len(tile_map) and tile_map[row_i + 1][col_i] == 'G':
+    for row_i in range(len(map_rows) - 2, -1, -1):
+        for col_i in range(len(map_rows[row_i])):
+            if map_rows[row_i][col_i] == '.' and tile_map.tile_at(col_i, row_i + 1) == TILE_GROUND:
                 player_start = (col_i * TILE_SIZE + 5, row_i * TILE_SIZE - 38)
                 break
         else:
             continue
         break
 
-    return tiles, coins, stars, enemies, thwomps, player_start
+    return LevelTemplate(level_def, tile_map, spawns, player_start)
+
+
+_level_templates = {}
+
+
+def load_level(level_index):
+    """LevelTemplate for LEVEL_DEFS[level_index], parsed on first use only"""
+    template = _level_templates.get(level_index)
+    if template is None:
+        template = build_level(LEVEL_DEFS[level_index])
+        _level_templates[level_index] = template
+    return template
+
+
+# --- LEVEL FILES ---
+# Binary level: LEVEL_HEADER, then cols * rows tile IDs in TileMap's
+# column-major order, then spawn_count LEVEL_SPAWN records. The tile grid is
+# used straight out of a read-only memory map, so a level only costs the
+# pages the game actually touches.
+
+LEVEL_MAGIC = b"SM64LVL1"
+# magic, cols, rows, spawn count, player start x/y, sky, ground, plat, accent, name, theme
+LEVEL_HEADER = struct.Struct("<8sIIIii3B3B3B3B32s16s")
+LEVEL_SPAWN = struct.Struct("<cii")  # map char, x, y
+LEVEL_FILE_EXT = ".sm64lvl"
+
+
+def _encode_name(name, size):
+    """UTF-8 name cut to at most size bytes without splitting a character"""
+    return name.encode("utf-8")[:size].decode("utf-8", errors="ignore").encode("utf-8")
+
+
+def save_level_file(template, path):
+    """Write a LevelTemplate in the binary level format"""
+    ldef = template.level_def
+    tile_map = template.tile_map
+    with open(path, "wb") as f:
+        f.write(LEVEL_HEADER.pack(
+            LEVEL_MAGIC, tile_map.cols, tile_map.rows, len(template.spawns),
+            *template.player_start, *ldef["sky"], *ldef["ground_color"],
+            *ldef["plat_color"], *ldef["accent"],
+            _encode_name(ldef["name"], 32), ldef["music_hint"].encode("ascii")[:16]))
+        f.write(tile_map.grid)
+        for char, x, y in template.spawns:
+            f.write(LEVEL_SPAWN.pack(char.encode("ascii"), x, y))
+
+
+def load_level_file(path):
+    """LevelTemplate whose tile grid is a zero-copy view of the mapped file"""
+    with open(path, "rb") as f:
+        # Before mapping: mmap refuses empty files with its own error
+        if os.fstat(f.fileno()).st_size < LEVEL_HEADER.size:
+            raise ValueError(f"{path} is too short to be a level file")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = LEVEL_HEADER.unpack_from(data)
+    if header[0] != LEVEL_MAGIC:
+        raise ValueError(f"{path} is not a level file")
+    cols, rows, spawn_count, start_x, start_y = header[1:6]
+    expected = LEVEL_HEADER.size + cols * rows + spawn_count * LEVEL_SPAWN.size
+    if expected > len(data):
+        raise ValueError(f"{path} is truncated: header needs {expected} bytes, file has {len(data)}")
+    colors = [tuple(header[i:i + 3]) for i in range(6, 18, 3)]
+    level_def = {
+        "name": header[18].rstrip(b"\0").decode("utf-8"),
+        "sky": colors[0],
+        "ground_color": colors[1],
+        "plat_color": colors[2],
+        "accent": colors[3],
+        "music_hint": header[19].rstrip(b"\0").decode("ascii"),
+    }
+
+    grid_start = LEVEL_HEADER.size
+    spawn_start = grid_start + cols * rows
+    grid = memoryview(data)[grid_start:spawn_start]  # Keeps the map open
+    spawns = [(char.decode("ascii"), x, y) for char, x, y in LEVEL_SPAWN.iter_unpack(
+        data[spawn_start:spawn_start + spawn_count * LEVEL_SPAWN.size])]
+
+    tile_map = TileMap(cols, rows, level_def["ground_color"], level_def["plat_color"], grid)
+    return LevelTemplate(level_def, tile_map, spawns, (start_x, start_y))
+
+
+def add_level(template):
+    """Append a loaded level after the built-in ones; returns its index"""
+    LEVEL_DEFS.append(template.level_def)
+    index = len(LEVEL_DEFS) - 1
+    _level_templates[index] = template
+    return index
+
+
+def export_levels(directory):
+    """Convert every LEVEL_DEFS entry to a level file in directory"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, level_def in enumerate(LEVEL_DEFS):
+        if "map" not in level_def:
+            continue  # Already loaded from a file
+        path = os.path.join(directory, f"level{i:02d}{LEVEL_FILE_EXT}")
+        save_level_file(build_level(level_def), path)
+        paths.append(path)
+    return paths
+
+
+# --- STREAMING ---
+
+class ChunkStreamer:
+    """Tracks which column chunks of a level are live and saves the rest.
+
+    Coins, stars, enemies and thwomps exist only in chunks within `radius`
+    chunks of the screen. When entities leave that window their state is
+    packed into one array('d') per kind on the chunk they are in. A chunk
+    coming back into range restores those, and spawns from the template the
+    first time it is seen.
+    """
+    KINDS = {'C': Coin, 'S': Star, 'E': Goomba, 'B': Boo, 'T': Thwomp}
+
+    def __init__(self, template, chunk_cols=STREAM_CHUNK_COLS, radius=STREAM_RADIUS):
+        self.template = template
+        self.chunk_px = chunk_cols * TILE_SIZE
+        self.radius = radius
+        self.spawns = template.chunk_spawns(chunk_cols)
+        self.active = set()
+        self.visited = set()
+        self.saved = {}  # chunk -> {kind: array('d') of STATE_SIZE-long records}
+
+    def chunk_of(self, x):
+        return min(len(self.spawns) - 1, max(0, int(x // self.chunk_px)))
+
+    def window(self, cam_x):
+        """First and last chunk that should be live with the camera at cam_x"""
+        first = self.chunk_of(cam_x) - self.radius
+        last = self.chunk_of(cam_x + SCREEN_WIDTH - 1) + self.radius
+        return max(0, first), min(len(self.spawns) - 1, last)
+
+    def load(self, chunk):
+        """Coins, stars, enemies and thwomps for a chunk entering the window"""
+        self.active.add(chunk)
+        if chunk in self.visited:
+            coins, stars, enemies, thwomps = [], [], [], []
+        else:
+            self.visited.add(chunk)
+            coins, stars, enemies, thwomps = self.template.instantiate(self.spawns[chunk])
+        lists = {'C': coins, 'S': stars, 'E': enemies, 'B': enemies, 'T': thwomps}
+        for kind, packed in self.saved.pop(chunk, {}).items():
+            cls = self.KINDS[kind]
+            size = cls.STATE_SIZE
+            for i in range(0, len(packed), size):
+                lists[kind].append(cls.from_state(packed[i:i + size]))
+        return coins, stars, enemies, thwomps
+
+    def save(self, entity, kind):
+        """Pack an entity leaving the window into the chunk it is in"""
+        chunk = self.chunk_of(entity.x)
+        self.saved.setdefault(chunk, {}).setdefault(kind, array("d")).extend(entity.save_state())
+
+
+# --- TEXT ---
+
+_fonts = {}
+_text_cache = OrderedDict()
+
+
+def get_font(name, size, bold=False, italic=False):
+    """Process-wide SysFont registry; font lookup can take milliseconds"""
+    key = (name, size, bold, italic)
+    font = _fonts.get(key)
+    if font is None:
+        font = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+        _fonts[key] = font
+    return font
+
+
+def render_text(font, text, color, antialias=True):
+    """font.render through an LRU cache. The surface is shared, so don't draw on it."""
+    key = (font, text, color, antialias)
+    surf = _text_cache.get(key)
+    if surf is None:
+        surf = font.render(text, antialias, color)
+        _text_cache[key] = surf
+        if len(_text_cache) > TEXT_CACHE_SIZE:
+            _text_cache.popitem(last=False)
+    else:
+        _text_cache.move_to_end(key)
+    return surf
+
+
+# --- PROFILER ---
+
+PROFILE_PHASES = ("events", "player", "enemies", "particles", "background",
+                  "tiles", "entities", "hud", "flip", "other")
+
+
+class FrameProfiler:
+    """Per-phase frame timings in a ring buffer of the last `size` frames.
+
+    lap(phase) charges the time since the previous lap to phase. While the
+    overlay is hidden nothing is timed and every call returns immediately.
+    """
+
+    def __init__(self, size=PROFILE_FRAMES):
+        self.size = size
+        self.enabled = False
+        self.samples = {phase: array("d", bytes(8 * size)) for phase in PROFILE_PHASES}
+        self.totals = array("d", bytes(8 * size))
+        self.index = 0  # Next slot to write
+        self.count = 0
+        self.current = dict.fromkeys(PROFILE_PHASES, 0.0)
+        self.frame_start = 0.0
+        self.mark = 0.0
+        self.stats = None  # (p50, p95, p99, {phase: mean}), refreshed while drawn
+        self.stats_age = 0
+        self.panel = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.index = self.count = 0
+        self.stats = None
+        self.begin_frame()  # Toggled mid-frame: time the rest of it
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.mark = time.perf_counter()
+        current = self.current
+        for phase in current:
+            current[phase] = 0.0
+
+    def lap(self, phase):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[phase] += now - self.mark
+        self.mark = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.lap("other")
+        i = self.index
+        for phase, seconds in self.current.items():
+            self.samples[phase][i] = seconds
+        self.totals[i] = self.mark - self.frame_start
+        self.index = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def percentiles(self):
+        """p50/p95/p99 frame time and mean per-phase time, all in ms"""
+        # toggle() restarts the ring at slot 0, so the first count slots are valid
+        n = self.count
+        ordered = sorted(self.totals[:n])
+        means = {phase: sum(self.samples[phase][:n]) * 1000 / n for phase in PROFILE_PHASES}
+        p50, p95, p99 = (ordered[min(n - 1, int(q * n))] * 1000 for q in (0.50, 0.95, 0.99))
+        return p50, p95, p99, means
+
+    def draw(self, screen):
+        if not self.enabled or self.count == 0:
+            return
+        self.stats_age -= 1
+        if self.stats is None or self.stats_age <= 0:
+            self.stats = self.percentiles()
+            self.stats_age = PROFILE_REFRESH
+        p50, p95, p99, means = self.stats
+
+        w, h = self.size + 20, 270
+        if self.panel is None:
+            self.panel = pygame.Surface((w, h), pygame.SRCALPHA)
+            self.panel.fill((0, 0, 0, 170))
+        x0 = SCREEN_WIDTH - w - 10
+        y0 = 60
+        screen.blit(self.panel, (x0, y0))
+
+        font = get_font("consolas", 14)
+        text = f"p50 {p50:5.2f}  p95 {p95:5.2f}  p99 {p99:5.2f} ms"
+        screen.blit(render_text(font, text, WHITE), (x0 + 10, y0 + 6))
+
+        # Frame-time graph, oldest on the left; the line marks one 60 Hz frame
+        gx, gy, gh = x0 + 10, y0 + 26, 70
+        budget = gy + gh - int(gh * SIM_DT / PROFILE_GRAPH_MAX)
+        pygame.draw.line(screen, (90, 90, 90), (gx, budget), (gx + self.size, budget))
+        n = self.count
+        start = self.index - n
+        points = []
+        for k in range(n):
+            t = min(self.totals[(start + k) % self.size], PROFILE_GRAPH_MAX)
+            points.append((gx + k, gy + gh - int(gh * t / PROFILE_GRAPH_MAX)))
+        if len(points) > 1:
+            pygame.draw.lines(screen, (0, 255, 120), False, points)
+
+        y = gy + gh + 8
+        for phase in PROFILE_PHASES:
+            text = f"{phase:<10}{means[phase]:6.3f} ms"
+            screen.blit(render_text(font, text, WHITE), (x0 + 10, y))
+            y += 16
 
 
 # --- HUD ---
 
+_overlays = {}
+
+
+def overlay(size, color, alpha):
+    """Cached solid color surface, faded with surface alpha instead of per pixel.
+
+    One surface per (size, color), made on first use, so translucent
+    overlays cost a blit rather than a full-screen allocation each frame.
+    """
+    key = (size, color)
+    surf = _overlays.get(key)
+    if surf is None:
+        surf = pygame.Surface(size).convert()
+        surf.fill(color)
+        _overlays[key] = surf
+    surf.set_alpha(alpha)
+    return surf
+
+
 def draw_hud(screen, player, level_name):
     # Semi-transparent HUD bar
-    hud_surf = pygame.Surface((SCREEN_WIDTH, 50), pygame.SRCALPHA)
-    hud_surf.fill((0, 0, 0, 140))
-    screen.blit(hud_surf, (0, 0))
+    screen.blit(overlay((SCREEN_WIDTH, 50), (0, 0, 0), 140), (0, 0))
 
-    hud_font = pygame.font.SysFont("arial", 22, bold=True)
+    hud_font = get_font("arial", 22, bold=True)
 
     # Health meter (pie wedges like SM64)
     health_x = 20
@@ -1216,14 +2498,14 @@ def draw_hud(screen, player, level_name):
         pygame.draw.circle(screen, color, (int(ax), int(ay)), 5)
 
     # Coins
-    coin_text = hud_font.render(f"x {player.coins}", True, COIN_GOLD)
+    coin_text = render_text(hud_font, f"x {player.coins}", COIN_GOLD)
     # Mini coin icon
     pygame.draw.ellipse(screen, COIN_GOLD, (80, 12, 16, 20))
     pygame.draw.ellipse(screen, (200, 170, 0), (82, 14, 12, 16))
     screen.blit(coin_text, (100, 12))
 
     # Stars
-    star_text = hud_font.render(f"x {player.stars}", True, STAR_YELLOW)
+    star_text = render_text(hud_font, f"x {player.stars}", STAR_YELLOW)
     # Mini star
     pts = []
     for j in range(10):
@@ -1234,27 +2516,25 @@ def draw_hud(screen, player, level_name):
     screen.blit(star_text, (215, 12))
 
     # Lives
-    lives_text = hud_font.render(f"LIVES: {player.lives}", True, WHITE)
+    lives_text = render_text(hud_font, f"LIVES: {player.lives}", WHITE)
     screen.blit(lives_text, (320, 12))
 
     # Level name
-    name_text = hud_font.render(level_name, True, WHITE)
+    name_text = render_text(hud_font, level_name, WHITE)
     screen.blit(name_text, (SCREEN_WIDTH - name_text.get_width() - 20, 12))
 
 
 def draw_star_get_screen(screen, star_timer):
     """SM64 Star Get! overlay"""
-    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
     alpha = min(180, star_timer * 3)
-    overlay.fill((255, 255, 200, alpha))
-    screen.blit(overlay, (0, 0))
+    screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (255, 255, 200), alpha), (0, 0))
 
-    big_font = pygame.font.SysFont("arial", 64, bold=True)
-    sub_font = pygame.font.SysFont("arial", 32, bold=True)
+    big_font = get_font("arial", 64, bold=True)
+    sub_font = get_font("arial", 32, bold=True)
 
     # Bouncy star text
     bounce = abs(math.sin(star_timer * 0.08)) * 20
-    text = big_font.render("STAR GET!", True, (200, 150, 0))
+    text = render_text(big_font, "STAR GET!", (200, 150, 0))
     screen.blit(text, (SCREEN_WIDTH // 2 - text.get_width() // 2,
                        SCREEN_HEIGHT // 2 - 60 - bounce))
 
@@ -1275,12 +2555,21 @@ def draw_star_get_screen(screen, star_timer):
 class GameState:
     def __init__(self, manager):
         self.manager = manager
+        self.redraw = True  # Screen holds something else; repaint all of it
     def handle_events(self, events):
         pass
     def update(self):
         pass
-    def render(self, screen):
+    def render(self, screen, alpha=1.0):
+        """alpha is how far the frame lies between the last two updates.
+
+        Returns None after painting the whole screen, or the list of rects
+        changed since this state's previous frame.
+        """
         pass
+    def render_rate(self):
+        """Frames per second to render at; menus gain nothing above FPS"""
+        return FPS
 
 
 class IntroState(GameState):
@@ -1297,15 +2586,17 @@ class IntroState(GameState):
             "Princess Toadstool"
         ]
 
-        self.font = pygame.font.SysFont("georgia", 38, bold=True)
+        self.font = get_font("georgia", 38, bold=True)
         if not self.font:
-            self.font = pygame.font.SysFont("timesnewroman", 38, bold=True)
-        self.sig_font = pygame.font.SysFont("brushscriptmt", 46, italic=True)
+            self.font = get_font("timesnewroman", 38, bold=True)
+        self.sig_font = get_font("brushscriptmt", 46, italic=True)
         if not self.sig_font:
-            self.sig_font = pygame.font.SysFont("arial", 40, bold=True, italic=True)
+            self.sig_font = get_font("arial", 40, bold=True, italic=True)
 
         self.parchment_surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
         self._render_parchment()
+        # Own surface rather than render_text's: its alpha is changed every frame
+        self.prompt = get_font("arial", 24, bold=True).render("- PRESS START -", True, (80, 40, 0))
 
     def _render_parchment(self):
         self.parchment_surf.fill(PARCHMENT)
@@ -1354,26 +2645,37 @@ class IntroState(GameState):
             if e.type == pygame.MOUSEBUTTONDOWN:
                 self.manager.change_state("LEVEL_SELECT")
 
-    def render(self, screen):
-        screen.blit(self.parchment_surf, (0, 0))
+    def render(self, screen, alpha=1.0):
+        prompt = self.prompt
+        rect = prompt.get_rect(topleft=(SCREEN_WIDTH//2 - prompt.get_width()//2, SCREEN_HEIGHT - 60))
+        if self.redraw:
+            screen.blit(self.parchment_surf, (0, 0))
+            self.redraw = False
+            dirty = None
+        else:
+            # Only the prompt pulses: restore the parchment under it
+            screen.blit(self.parchment_surf, rect, rect)
+            dirty = [rect]
         pulse = abs(math.sin(pygame.time.get_ticks() * 0.005)) * 255
-        pf = pygame.font.SysFont("arial", 24, bold=True)
-        prompt = pf.render("- PRESS START -", True, (80, 40, 0))
         prompt.set_alpha(int(pulse))
-        screen.blit(prompt, (SCREEN_WIDTH//2 - prompt.get_width()//2, SCREEN_HEIGHT - 60))
+        screen.blit(prompt, rect)
+        return dirty
 
 
 class LevelSelectState(GameState):
     """Debug-style level select with all 15 SM64 levels"""
     def __init__(self, manager):
         super().__init__(manager)
-        self.font = pygame.font.SysFont("couriernew", 20, bold=True)
-        self.title_font = pygame.font.SysFont("couriernew", 26, bold=True)
-        self.small_font = pygame.font.SysFont("couriernew", 14)
+        self.font = get_font("couriernew", 20, bold=True)
+        self.title_font = get_font("couriernew", 26, bold=True)
+        self.small_font = get_font("couriernew", 14)
         self.selected = 0
         self.scroll_offset = 0
         self.visible_count = 12
         self.blink = 0
+        self.drawn_view = None  # (selected, scroll, level count) on screen
+        self.drawn_fps = None
+        self.fps_rect = None
 
     def handle_events(self, events):
         for e in events:
@@ -1396,18 +2698,35 @@ class LevelSelectState(GameState):
     def update(self):
         self.blink += 1
 
-    def render(self, screen):
+    def _draw_fps(self, screen, fps):
+        fps_t = render_text(self.small_font, f"FPS: {fps}", WHITE)
+        self.fps_rect = screen.blit(fps_t, (SCREEN_WIDTH - 120, 30))
+        self.drawn_fps = fps
+
+    def render(self, screen, alpha=1.0):
+        fps = int(self.manager.clock.get_fps())
+        view = (self.selected, self.scroll_offset, len(LEVEL_DEFS))
+        if not self.redraw and view == self.drawn_view:
+            # Menu unchanged; at most the FPS counter needs repainting
+            if fps == self.drawn_fps:
+                return []
+            old = self.fps_rect
+            screen.fill(DEBUG_BLUE, old)
+            self._draw_fps(screen, fps)
+            return [old.union(self.fps_rect)]
+        self.redraw = False
+        self.drawn_view = view
+
         screen.fill(DEBUG_BLUE)
 
         # Header
-        header = self.title_font.render("SUPER MARIO 64 - LEVEL SELECT", True, WHITE)
+        header = render_text(self.title_font, "SUPER MARIO 64 - LEVEL SELECT", WHITE)
         screen.blit(header, (40, 30))
 
-        build = self.small_font.render("BUILD 95-07-29  RSP:OK  RDP:OK  Z-BUF:ON", True, (180, 180, 200))
+        build = render_text(self.small_font, "BUILD 95-07-29  RSP:OK  RDP:OK  Z-BUF:ON", (180, 180, 200))
         screen.blit(build, (40, 60))
 
-        fps_t = self.small_font.render(f"FPS: {int(self.manager.clock.get_fps())}", True, WHITE)
-        screen.blit(fps_t, (SCREEN_WIDTH - 120, 30))
+        self._draw_fps(screen, fps)
 
         # Separator
         pygame.draw.line(screen, (60, 60, 160), (40, 85), (SCREEN_WIDTH - 40, 85), 1)
@@ -1426,17 +2745,17 @@ class LevelSelectState(GameState):
                 pygame.draw.rect(screen, (40, 40, 120),
                                (50, y - 2, SCREEN_WIDTH - 100, line_h - 4))
                 # Cursor
-                cursor = self.font.render(">", True, DEBUG_YELLOW)
+                cursor = render_text(self.font, ">", DEBUG_YELLOW)
                 screen.blit(cursor, (55, y + 2))
 
             # Level number
             num_str = f"{i+1:02d}"
-            num = self.font.render(num_str, True, (120, 120, 180))
+            num = render_text(self.font, num_str, (120, 120, 180))
             screen.blit(num, (80, y + 2))
 
             # Level name
             color = DEBUG_YELLOW if is_sel else WHITE
-            name = self.font.render(ldef["name"], True, color)
+            name = render_text(self.font, ldef["name"], color)
             screen.blit(name, (130, y + 2))
 
             # Theme preview (small color swatch)
@@ -1446,10 +2765,10 @@ class LevelSelectState(GameState):
 
         # Scroll indicators
         if self.scroll_offset > 0:
-            up_arrow = self.font.render("^ MORE ^", True, (150, 150, 200))
+            up_arrow = render_text(self.font, "^ MORE ^", (150, 150, 200))
             screen.blit(up_arrow, (SCREEN_WIDTH//2 - up_arrow.get_width()//2, 88))
         if self.scroll_offset + self.visible_count < len(LEVEL_DEFS):
-            dn_arrow = self.font.render("v MORE v", True, (150, 150, 200))
+            dn_arrow = render_text(self.font, "v MORE v", (150, 150, 200))
             screen.blit(dn_arrow, (SCREEN_WIDTH//2 - dn_arrow.get_width()//2,
                                     start_y + self.visible_count * line_h))
 
@@ -1462,36 +2781,155 @@ class LevelSelectState(GameState):
             "IN-GAME: Arrows/WASD=Move  Z=Jump  X=Dive  C=Ground Pound"
         ]
         for j, c in enumerate(controls):
-            ct = self.small_font.render(c, True, (150, 150, 200))
+            ct = render_text(self.small_font, c, (150, 150, 200))
             screen.blit(ct, (40, ctrl_y + j * 20))
 
         # Footer
-        footer = self.small_font.render("CONFIDENTIAL - NINTENDO EAD - NOT FOR DISTRIBUTION", True, (80, 80, 140))
+        footer = render_text(self.small_font, "CONFIDENTIAL - NINTENDO EAD - NOT FOR DISTRIBUTION", (80, 80, 140))
         screen.blit(footer, (40, SCREEN_HEIGHT - 25))
+        return None
 
 
 class GameplayState(GameState):
     """Full platforming gameplay state"""
+    PAUSE_MENU_RECT = pygame.Rect(0, 255, SCREEN_WIDTH, 150)  # Area the options cover
+
     def __init__(self, manager, level_index=0):
         super().__init__(manager)
         self.level_index = level_index
-        self.level_def = LEVEL_DEFS[level_index]
-        self.tiles, self.coins, self.stars, self.enemies, self.thwomps, player_start = build_level(self.level_def)
-        self.player = Player(*player_start)
+        template = load_level(level_index)
+        self.level_def = template.level_def
+        self.tile_map = template.tile_map
+        self.coins = []
+        self.stars = []
+        self.enemies = []
+        self.thwomps = []
+        self.player = Player(*template.player_start)
         self.camera = Camera()
-        self.particles = []
+        self.view = Camera()  # Camera interpolated for the frame being drawn
+        self.draw_camera = Camera()  # view, shifted to draw one entity interpolated
+        self.goomba_batch = None
+        self.particles = ParticlePool() if np is not None else ParticleList()
         self.paused = False
         self.pause_selected = 0
-        self.pause_font = pygame.font.SysFont("arial", 36, bold=True)
+        self.pause_drawn = None  # Selection shown by the paused frame on screen
+        self.pause_backdrop = None
+        self.pause_font = get_font("arial", 36, bold=True)
         self.complete = False
         self.complete_timer = 0
-        self.lava_anim = 0
-        self.water_anim = 0
+        self.tile_clock = 0  # Drives the lava, water and sand animations
+
+        self.tile_layer = template.tile_layer
+        if template.backdrop is None:
+            template.backdrop = build_backdrop(self.level_def)
+        self.backdrop = template.backdrop
+        self.palette_layer = None
+        if PALETTE_RENDER:
+            if template.palette_layer is None:
+                template.palette_layer = PaletteTileLayer(self.tile_map)
+            self.palette_layer = template.palette_layer
+        elif template.tile_atlas is None:
+            template.tile_atlas = AnimatedTileAtlas(self.tile_map.colors)
+        self.tile_atlas = template.tile_atlas
+
+        # Draw culling: coins, stars, enemies, thwomps in layering order
+        self.entity_index = SpatialHash()
+        self.level_stars = template.star_count
+        self.stars_left = template.star_count  # Streamed-out stars count too
+
+        # Only chunks around the camera have live coins and enemies
+        self.streamer = ChunkStreamer(template)
+        self.stream_window = None
 
         # Level dimensions
-        map_data = self.level_def["map"]
-        self.level_w = len(map_data[0]) * TILE_SIZE
-        self.level_h = len(map_data) * TILE_SIZE
+        self.level_w = self.tile_map.pixel_width
+        self.level_h = self.tile_map.pixel_height
+
+        # Start on the player, so the first frames don't interpolate in from (0, 0)
+        self.camera.snap(self.player.x + self.player.w // 2,
+                         self.player.y + self.player.h // 2,
+                         self.level_w, self.level_h)
+        self._stream()
+
+    def _stream(self):
+        """Pack away entities that left the live window and load chunks entering it"""
+        streamer = self.streamer
+        window = streamer.window(self.camera.x)
+        if window == self.stream_window:
+            return
+        self.stream_window = first, last = window
+        index = self.entity_index
+
+        streamer.active = {chunk for chunk in streamer.active if first <= chunk <= last}
+        coins = []
+        for coin in self.coins:
+            if first <= streamer.chunk_of(coin.x) <= last:
+                coins.append(coin)
+            else:
+                index.remove(coin)
+                if not coin.collected:
+                    streamer.save(coin, 'C')
+        stars = []
+        for star in self.stars:
+            if first <= streamer.chunk_of(star.x) <= last:
+                stars.append(star)
+            else:
+                index.remove(star)
+                if not star.collected:
+                    streamer.save(star, 'S')
+        enemies = []
+        for enemy in self.enemies:
+            if first <= streamer.chunk_of(enemy.x) <= last:
+                enemies.append(enemy)
+            else:
+                index.remove(enemy)
+                if isinstance(enemy, Boo):
+                    streamer.save(enemy, 'B')
+                elif enemy.alive or enemy.squish_timer > 0:
+                    streamer.save(enemy, 'E')
+        thwomps = []
+        for thwomp in self.thwomps:
+            if first <= streamer.chunk_of(thwomp.x) <= last:
+                thwomps.append(thwomp)
+            else:
+                index.remove(thwomp)
+                streamer.save(thwomp, 'T')
+
+        for chunk in range(first, last + 1):
+            if chunk in streamer.active:
+                continue
+            new_coins, new_stars, new_enemies, new_thwomps = streamer.load(chunk)
+            for entity in new_coins:
+                index.insert(entity, LAYER_COINS)
+            for entity in new_stars:
+                index.insert(entity, LAYER_STARS)
+            for entity in new_enemies:
+                index.insert(entity, LAYER_ENEMIES)
+            for entity in new_thwomps:
+                index.insert(entity, LAYER_THWOMPS)
+            coins += new_coins
+            stars += new_stars
+            enemies += new_enemies
+            thwomps += new_thwomps
+        self.coins, self.stars, self.enemies, self.thwomps = coins, stars, enemies, thwomps
+
+        if BATCH_ENEMIES and np is not None:
+            # Rebuild the batch around the Goombas now live; rows are views after this
+            old = self.goomba_batch
+            goombas = [e for e in enemies if isinstance(e, Goomba)]
+            self.goomba_batch = GoombaBatch(goombas, self.tile_map,
+                                            old.solid if old is not None else None)
+            views = iter(self.goomba_batch.views)
+            for i, enemy in enumerate(enemies):
+                if isinstance(enemy, Goomba):
+                    index.remove(enemy)
+                    enemies[i] = next(views)
+                    index.insert(enemies[i], LAYER_ENEMIES)
+            self.goomba_batch.moved_cells(index.cell_size)
+
+        self.tile_layer.retain(first * streamer.chunk_px, (last + 1) * streamer.chunk_px)
+        if self.palette_layer is not None:
+            self.palette_layer.retain(first * streamer.chunk_px, (last + 1) * streamer.chunk_px)
 
     def handle_events(self, events):
         for e in events:
@@ -1534,8 +2972,10 @@ class GameplayState(GameState):
                 self.manager.change_state("LEVEL_SELECT")
             return
 
-        keys = pygame.key.get_pressed()
-        self.player.update(keys, self.tiles)
+        prof = self.manager.profiler
+        keys = self.manager.get_keys()
+        self.player.update(keys, self.tile_map)
+        prof.lap("player")
 
         # Death handling
         if self.player.dead and self.player.death_timer <= 0:
@@ -1549,65 +2989,60 @@ class GameplayState(GameState):
         self.camera.update(self.player.x + self.player.w // 2,
                           self.player.y + self.player.h // 2,
                           self.level_w, self.level_h)
+        self._stream()
 
         # Coins
         for coin in self.coins:
             coin.update()
             if not coin.collected and self.player.rect.colliderect(coin.rect):
                 coin.collected = True
+                self.entity_index.remove(coin)
                 self.player.collect_coin()
                 # Coin particles
                 for _ in range(8):
-                    self.particles.append(
-                        Particle(coin.x + 10, coin.y + 10, (255, 215, 0),
-                                vel=(random.uniform(-3, 3), random.uniform(-5, -1)),
-                                life=20, size=3))
+                    self.particles.emit(coin.x + 10, coin.y + 10, (255, 215, 0),
+                                        vel=(SIM_RNG.uniform(-3, 3), SIM_RNG.uniform(-5, -1)),
+                                        life=20, size=3)
 
         # Stars
         for star in self.stars:
             star.update()
             if not star.collected and self.player.rect.colliderect(star.rect):
                 star.collected = True
+                self.stars_left -= 1
+                self.entity_index.remove(star)
                 self.player.collect_star()
                 # Big star particles
                 for _ in range(30):
-                    self.particles.append(
-                        Particle(star.x + 16, star.y + 16,
-                                random.choice([(255, 255, 100), (255, 200, 50), (255, 255, 255)]),
-                                vel=(random.uniform(-5, 5), random.uniform(-8, -2)),
-                                life=60, size=random.randint(2, 6)))
+                    self.particles.emit(star.x + 16, star.y + 16,
+                                        SIM_RNG.choice([(255, 255, 100), (255, 200, 50), (255, 255, 255)]),
+                                        vel=(SIM_RNG.uniform(-5, 5), SIM_RNG.uniform(-8, -2)),
+                                        life=60, size=SIM_RNG.randint(2, 6))
 
         # Check if all stars collected
-        all_stars = all(s.collected for s in self.stars) and len(self.stars) > 0
+        all_stars = self.stars_left == 0 and self.level_stars > 0
         if all_stars and self.player.star_collected_timer == 1:
             self.complete = True
             self.complete_timer = 180
+        prof.lap("other")
 
         # Enemies
+        if self.goomba_batch is not None:
+            self.goomba_batch.update()
+            for enemy in self.goomba_batch.moved_cells(self.entity_index.cell_size):
+                self.entity_index.move(enemy)
+            for enemy in self.goomba_batch.touching(self.player.rect):
+                self._goomba_contact(enemy)
         for enemy in self.enemies:
+            if isinstance(enemy, GoombaView):
+                continue  # Stepped and collided by the batch above
             if isinstance(enemy, Goomba):
-                enemy.update(self.tiles)
-                if enemy.alive and self.player.rect.colliderect(enemy.rect):
-                    # Check if stomping
-                    if self.player.vy > 0 and self.player.y + self.player.h - 10 < enemy.y + 5:
-                        enemy.stomp()
-                        self.player.vy = -8
-                        self.player.coins += 1
-                        for _ in range(5):
-                            self.particles.append(
-                                Particle(enemy.x + 15, enemy.y, (139, 90, 43),
-                                        life=20, size=2))
-                    elif self.player.ground_pound and self.player.vy > 0:
-                        enemy.stomp()
-                        for _ in range(8):
-                            self.particles.append(
-                                Particle(enemy.x + 15, enemy.y, (139, 90, 43),
-                                        vel=(random.uniform(-4, 4), random.uniform(-6, -2)),
-                                        life=25, size=3))
-                    else:
-                        self.player.take_damage()
+                enemy.update(self.tile_map)
+                self.entity_index.move(enemy)
+                self._goomba_contact(enemy)
             elif isinstance(enemy, Boo):
                 enemy.update(self.player.facing, self.player.x)
+                self.entity_index.move(enemy)
                 if enemy.alive and enemy.alpha > 150:
                     if self.player.rect.colliderect(enemy.rect):
                         self.player.take_damage()
@@ -1615,6 +3050,7 @@ class GameplayState(GameState):
         # Thwomps
         for thwomp in self.thwomps:
             thwomp.update(self.player.x)
+            self.entity_index.move(thwomp)
             if self.player.rect.colliderect(thwomp.rect):
                 if self.player.vy > 0 and self.player.y + self.player.h < thwomp.y + 15:
                     self.player.y = thwomp.y - self.player.h
@@ -1622,92 +3058,87 @@ class GameplayState(GameState):
                     self.player.on_ground = True
                 else:
                     self.player.take_damage()
+        prof.lap("enemies")
 
         # Particles
-        for p in self.particles:
-            p.update()
-        self.particles = [p for p in self.particles if p.life > 0]
+        self.particles.update()
+        prof.lap("particles")
 
         # Anim counters
-        self.lava_anim += 1
-        self.water_anim += 1
+        self.tile_clock += 1
+
+    def _goomba_contact(self, enemy):
+        if enemy.alive and self.player.rect.colliderect(enemy.rect):
+            # Check if stomping
+            if self.player.vy > 0 and self.player.y + self.player.h - 10 < enemy.y + 5:
+                enemy.stomp()
+                self.player.vy = -8
+                self.player.coins += 1
+                for _ in range(5):
+                    self.particles.emit(enemy.x + 15, enemy.y, (139, 90, 43),
+                                        life=20, size=2)
+            elif self.player.ground_pound and self.player.vy > 0:
+                enemy.stomp()
+                for _ in range(8):
+                    self.particles.emit(enemy.x + 15, enemy.y, (139, 90, 43),
+                                        vel=(SIM_RNG.uniform(-4, 4), SIM_RNG.uniform(-6, -2)),
+                                        life=25, size=3)
+            else:
+                self.player.take_damage()
+
+    def sim_checksum(self):
+        """CRC of the simulation state; equal runs give equal checksums.
+        Values are packed as doubles so an int 370 and the batched 370.0 agree."""
+        p = self.player
+        state = [p.x, p.y, p.vx, p.vy, p.health, p.coins, p.stars, p.lives, p.dead]
+        for entity in self.enemies + self.thwomps:
+            state += [entity.x, entity.y, entity.alive]
+        state += [c.collected for c in self.coins]
+        state += [s.collected for s in self.stars]
+        return zlib.crc32(struct.pack(f"<{len(state)}d", *map(float, state)))
+
+    def render_rate(self):
+        # Interpolated frames only help while the simulation is moving
+        return FPS if self.paused or self.complete else RENDER_FPS
+
+    def render(self, screen, alpha=1.0):
+        if self.paused and not self.complete and self.pause_drawn is not None and not self.redraw:
+            # The paused frame is still on screen; only the menu can change
+            return self._update_pause_menu(screen)
+        self.redraw = False
+        if self.paused or self.complete:
+            alpha = 1.0  # Simulation is frozen; show the last state as-is
+        view = self.view
+        view.interpolate(self.camera, alpha)
+        prof = self.manager.profiler
 
-    def render(self, screen):
         # Sky
         screen.fill(self.level_def["sky"])
 
         # Background decorations based on theme
         self._draw_bg_decor(screen)
+        prof.lap("background")
 
-        # Tiles
-        for tile in self.tiles:
-            sx = tile["rect"].x - self.camera.x
-            sy = tile["rect"].y - self.camera.y
-            r = pygame.Rect(sx, sy, TILE_SIZE, TILE_SIZE)
-
-            if tile["type"] == "lava":
-                # Animated lava
-                base = tile["color"]
-                flicker = int(math.sin(self.lava_anim * 0.1 + tile["rect"].x * 0.05) * 30)
-                color = (min(255, base[0] + flicker), max(0, base[1] + flicker // 2), base[2])
-                pygame.draw.rect(screen, color, r)
-                # Lava surface shine
-                for i in range(3):
-                    lx = sx + random.randint(0, TILE_SIZE)
-                    ly = sy + 2
-                    pygame.draw.circle(screen, (255, 200, 50), (lx, ly), random.randint(1, 3))
-            elif tile["type"] == "water":
-                # Animated water
-                wave = int(math.sin(self.water_anim * 0.05 + tile["rect"].x * 0.03) * 10)
-                color = (30, max(0, 100 + wave), min(255, 200 + wave))
-                pygame.draw.rect(screen, color, r)
-                # Surface ripples
-                if sy < SCREEN_HEIGHT:
-                    ry = sy + 2
-                    pygame.draw.line(screen, (80, 160, 255), (sx, ry), (sx + TILE_SIZE, ry + 2), 1)
-            elif tile["type"] == "ice":
-                pygame.draw.rect(screen, tile["color"], r)
-                # Ice shine
-                pygame.draw.line(screen, (220, 240, 255), (sx + 3, sy + 3), (sx + 15, sy + 15), 1)
-                pygame.draw.line(screen, (220, 240, 255), (sx + 20, sy + 5), (sx + 30, sy + 10), 1)
-            elif tile["type"] == "sand":
-                pygame.draw.rect(screen, tile["color"], r)
-                # Sand dots
-                for _ in range(3):
-                    dx = random.randint(2, TILE_SIZE - 2)
-                    dy = random.randint(2, TILE_SIZE - 2)
-                    pygame.draw.circle(screen, (190, 160, 100), (sx + dx, sy + dy), 1)
-            else:
-                pygame.draw.rect(screen, tile["color"], r)
-                # Ground/platform detail
-                darker = tuple(max(0, c - 30) for c in tile["color"])
-                pygame.draw.rect(screen, darker, r, 2)
-                # Top highlight
-                lighter = tuple(min(255, c + 40) for c in tile["color"])
-                pygame.draw.line(screen, lighter, (sx, sy), (sx + TILE_SIZE, sy), 2)
-
-        # Coins
-        for coin in self.coins:
-            coin.draw(screen, self.camera)
-
-        # Stars
-        for star in self.stars:
-            star.draw(screen, self.camera)
-
-        # Enemies
-        for enemy in self.enemies:
-            enemy.draw(screen, self.camera)
+        # Tiles: cached static chunks, then animated tiles on top
+        entities = self.entity_index.query(view.view_rect(CULL_MARGIN))
+        if self.palette_layer is None:
+            self.tile_atlas.draw(screen, self.tile_layer.draw(screen, view), self.tile_clock, view)
+        else:
+            entities = self._draw_palette_world(screen, entities)
+        prof.lap("tiles")
 
-        # Thwomps
-        for thwomp in self.thwomps:
-            thwomp.draw(screen, self.camera)
+        # Coins, stars, enemies and thwomps near the screen, in that order
+        for entity in entities:
+            self._draw_interpolated(screen, entity, alpha)
+        prof.lap("entities")
 
         # Particles
-        for p in self.particles:
-            p.draw(screen, self.camera)
+        self.particles.draw(screen, view)
+        prof.lap("particles")
 
         # Player
-        self.player.draw(screen, self.camera)
+        self._draw_interpolated(screen, self.player, alpha)
+        prof.lap("entities")
 
         # HUD
         draw_hud(screen, self.player, self.level_def["name"])
@@ -1719,25 +3150,48 @@ class GameplayState(GameState):
         # Pause menu
         if self.paused:
             self._draw_pause(screen)
+        else:
+            self.pause_drawn = None
 
         # Level complete overlay
         if self.complete:
             self._draw_complete(screen)
+        prof.lap("hud")
+
+    def _draw_palette_world(self, screen, entities):
+        """Compose tiles and coins in 8 bits and blit them; return the entities left"""
+        layer = self.palette_layer
+        world = layer.compose(self.view)
+        drawn = 0
+        for entity in entities:  # Coins come first in layering order
+            if not isinstance(entity, Coin):
+                break
+            entity.draw(world, self.view, layer.coin_colors(entity))
+            drawn += 1
+        layer.present(screen, self.tile_clock)
+        return entities[drawn:]
+
+    def _draw_interpolated(self, screen, entity, alpha):
+        """Draw entity between its last two positions by shifting the camera"""
+        if not hasattr(entity, "prev_x"):
+            entity.draw(screen, self.view)  # Static: coins and stars
+            return
+        cam = self.draw_camera
+        cam.x = self.view.x + (entity.x - entity.prev_x) * (1.0 - alpha)
+        cam.y = self.view.y + (entity.y - entity.prev_y) * (1.0 - alpha)
+        entity.draw(screen, cam)
 
     def _draw_bg_decor(self, screen):
         """Theme-specific background decorations"""
+        view = self.view
         theme = self.level_def["music_hint"]
         t = pygame.time.get_ticks()
 
-        if theme == "grass":
-            # Distant hills
-            for i in range(5):
-                hx = (i * 250 - self.camera.x * 0.2) % (SCREEN_WIDTH + 200) - 100
-                hy = SCREEN_HEIGHT - 200
-                color = tuple(min(255, c + 30) for c in self.level_def["sky"])
-                pygame.draw.ellipse(screen, color, (hx, hy, 300, 150))
+        # Hills, stalactites, pyramids, rainbow and bricks are pre-rendered
+        for layer in self.backdrop:
+            layer.draw(screen, view.x)
 
-        elif theme == "snow":
+        if theme == "snow":
             # Snowflakes
             for i in range(20):
                 sx = (i * 47 + t // 20) % SCREEN_WIDTH
@@ -1746,10 +3200,8 @@ class GameplayState(GameState):
 
         elif theme == "spooky":
             # Fog
-            fog = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
             alpha = int(abs(math.sin(t * 0.001)) * 40) + 20
-            fog.fill((100, 80, 120, alpha))
-            screen.blit(fog, (0, 0))
+            screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (100, 80, 120), alpha), (0, 0))
 
         elif theme == "lava":
             # Heat haze at top
@@ -1758,90 +3210,185 @@ class GameplayState(GameState):
                 hy = int(math.sin(t * 0.003 + i * 0.5) * 5) + 5
                 pygame.draw.line(screen, (60, 20, 0, 80), (hx, hy), (hx + 10, hy), 2)
 
-        elif theme == "cave":
-            # Stalactites
-            for i in range(8):
-                cx = (i * 120 - int(self.camera.x * 0.1)) % (SCREEN_WIDTH + 60) - 30
-                pygame.draw.polygon(screen, (50, 40, 35),
-                                   [(cx, 0), (cx + 15, 60), (cx + 30, 0)])
-
-        elif theme == "desert":
-            # Distant pyramids
-            for i in range(3):
-                px = (i * 350 - int(self.camera.x * 0.15)) % (SCREEN_WIDTH + 200) - 100
-                py = SCREEN_HEIGHT - 250
-                pygame.draw.polygon(screen, (200, 170, 100),
-                                   [(px, py + 100), (px + 60, py), (px + 120, py + 100)])
-
-        elif theme == "sky":
-            # Rainbow stripes
-            rainbow_colors = [(255, 0, 0), (255, 127, 0), (255, 255, 0),
-                            (0, 255, 0), (0, 0, 255), (75, 0, 130), (148, 0, 211)]
-            for i, rc in enumerate(rainbow_colors):
-                stripe_y = 50 + i * 15
-                stripe_surf = pygame.Surface((SCREEN_WIDTH, 12), pygame.SRCALPHA)
-                stripe_surf.fill((*rc, 40))
-                screen.blit(stripe_surf, (0, stripe_y))
-
         elif theme == "water":
             # Light rays from above
+            ray = overlay((30, SCREEN_HEIGHT), (200, 220, 255), 15)
             for i in range(5):
                 rx = (i * 180 + int(t * 0.02)) % SCREEN_WIDTH
-                ray_surf = pygame.Surface((30, SCREEN_HEIGHT), pygame.SRCALPHA)
-                ray_surf.fill((200, 220, 255, 15))
-                screen.blit(ray_surf, (rx, 0))
-
-        elif theme == "fortress":
-            # Brick pattern overlay
-            for row in range(0, SCREEN_HEIGHT, 40):
-                offset = 20 if (row // 40) % 2 else 0
-                for col in range(-20 + offset, SCREEN_WIDTH + 20, 40):
-                    pygame.draw.rect(screen, (0, 0, 0, 10),
-                                   (col, row, 38, 18), 1)
+                screen.blit(ray, (rx, 0))
 
     def _draw_pause(self, screen):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 150))
-        screen.blit(overlay, (0, 0))
+        screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0, 0), 150), (0, 0))
 
-        title = self.pause_font.render("PAUSED", True, WHITE)
+        title = render_text(self.pause_font, "PAUSED", WHITE)
         screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 180))
 
+        self.pause_backdrop = screen.subsurface(self.PAUSE_MENU_RECT).copy()
+        self._draw_pause_options(screen)
+
+    def _draw_pause_options(self, screen):
         options = ["CONTINUE", "RESTART", "EXIT TO MENU"]
         for i, opt in enumerate(options):
             is_sel = (i == self.pause_selected)
             color = YELLOW if is_sel else WHITE
             prefix = "> " if is_sel else "  "
-            text = self.pause_font.render(prefix + opt, True, color)
+            text = render_text(self.pause_font, prefix + opt, color)
             screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 260 + i * 50))
+        self.pause_drawn = self.pause_selected
+
+    def _update_pause_menu(self, screen):
+        """Repaint just the options when the selection moved; dirty rects"""
+        if self.pause_selected == self.pause_drawn:
+            return []
+        screen.blit(self.pause_backdrop, self.PAUSE_MENU_RECT)
+        self._draw_pause_options(screen)
+        return [self.PAUSE_MENU_RECT]
 
     def _draw_complete(self, screen):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
         alpha = min(200, (180 - self.complete_timer) * 3)
-        overlay.fill((0, 0, 0, alpha))
-        screen.blit(overlay, (0, 0))
+        screen.blit(overlay((SCREEN_WIDTH, SCREEN_HEIGHT), (0, 0, 0), alpha), (0, 0))
 
-        big = pygame.font.SysFont("arial", 52, bold=True)
-        sub = pygame.font.SysFont("arial", 28, bold=True)
+        big = get_font("arial", 52, bold=True)
+        sub = get_font("arial", 28, bold=True)
 
-        text = big.render("COURSE CLEAR!", True, STAR_YELLOW)
+        text = render_text(big, "COURSE CLEAR!", STAR_YELLOW)
         screen.blit(text, (SCREEN_WIDTH//2 - text.get_width()//2, 200))
 
-        coins_t = sub.render(f"COINS: {self.player.coins}", True, COIN_GOLD)
+        coins_t = render_text(sub, f"COINS: {self.player.coins}", COIN_GOLD)
         screen.blit(coins_t, (SCREEN_WIDTH//2 - coins_t.get_width()//2, 300))
 
-        stars_t = sub.render(f"STARS: {self.player.stars}", True, STAR_YELLOW)
+        stars_t = render_text(sub, f"STARS: {self.player.stars}", STAR_YELLOW)
         screen.blit(stars_t, (SCREEN_WIDTH//2 - stars_t.get_width()//2, 340))
 
 
+# --- INPUT ---
+
+class KeyState:
+    """Stand-in for pygame.key.get_pressed() built from a set of held keys"""
+    def __init__(self, held=()):
+        self.held = set(held)
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+class ScriptedInput:
+    """Deterministic benchmark input: run back and forth, jumping and diving"""
+    def __init__(self, turn_every=240, jump_every=45, dive_every=150):
+        self.turn_every = turn_every
+        self.jump_every = jump_every
+        self.dive_every = dive_every
+
+    def keys(self, frame):
+        going_right = (frame // self.turn_every) % 2 == 0
+        return KeyState([pygame.K_RIGHT if going_right else pygame.K_LEFT])
+
+    def events(self, frame):
+        events = []
+        if frame % self.jump_every == 0:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_z))
+        if frame % self.dive_every == self.jump_every // 2:
+            events.append(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_x))
+        return events
+
+
+# Replay files: a header, then one little-endian uint32 per simulation step.
+# The low 16 bits are the REPLAY_KEYS held that step, the high 16 bits the
+# ones pressed (KEYDOWN) that step.
+REPLAY_MAGIC = b"SM64RPL1"
+REPLAY_HEADER = struct.Struct("<8sHQII")  # magic, level, seed, frames, checksum
+REPLAY_KEYS = (
+    pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+    pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s,
+    pygame.K_z, pygame.K_x, pygame.K_c, pygame.K_SPACE,
+    pygame.K_RETURN, pygame.K_ESCAPE,
+)
+REPLAY_KEY_BITS = {key: bit for bit, key in enumerate(REPLAY_KEYS)}
+
+
+def decode_input(word):
+    """Held keys and KEYDOWN events for one recorded step"""
+    held = KeyState(key for bit, key in enumerate(REPLAY_KEYS) if word >> bit & 1)
+    events = [pygame.event.Event(pygame.KEYDOWN, key=key)
+              for bit, key in enumerate(REPLAY_KEYS) if word >> (16 + bit) & 1]
+    return held, events
+
+
+class InputRecorder:
+    """Captures live input one simulation step at a time.
+
+    capture() returns the step's input in the same decoded form a replay
+    will produce, so the live run and its replay take identical paths.
+    """
+    def __init__(self, level_index, seed):
+        self.level_index = level_index
+        self.seed = seed
+        self.frames = array("I")
+        self.keys = KeyState()
+
+    def capture(self, events, pressed):
+        word = 0
+        for bit, key in enumerate(REPLAY_KEYS):
+            if pressed[key]:
+                word |= 1 << bit
+        for e in events:
+            if e.type == pygame.KEYDOWN and e.key in REPLAY_KEY_BITS:
+                word |= 1 << (16 + REPLAY_KEY_BITS[e.key])
+        self.frames.append(word)
+        self.keys, events = decode_input(word)
+        return events
+
+    def save(self, path, checksum):
+        frames = array("I", self.frames)
+        if sys.byteorder == "big":
+            frames.byteswap()
+        with open(path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, self.level_index, self.seed,
+                                       len(frames), checksum))
+            f.write(frames.tobytes())
+
+
+class InputReplay:
+    """Feeds a recording back in place of the keyboard, like ScriptedInput"""
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, self.level_index, self.seed, count, self.checksum = \
+            REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC:
+            raise ValueError(f"{path} is not a replay file")
+        self.frames = array("I")
+        self.frames.frombytes(data[REPLAY_HEADER.size:REPLAY_HEADER.size + count * 4])
+        if sys.byteorder == "big":
+            self.frames.byteswap()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def keys(self, frame):
+        return decode_input(self.frames[frame] if frame < len(self.frames) else 0)[0]
+
+    def events(self, frame):
+        return decode_input(self.frames[frame] if frame < len(self.frames) else 0)[1]
+
+
 # --- GAME MANAGER ---
 
 class Game:
-    def __init__(self):
+    def __init__(self, headless=False):
+        if headless:
+            # No window: SDL's dummy driver renders to an offscreen surface
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
         pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Ultra Mario 3D N64 - Debug Build")
         self.clock = pygame.time.Clock()
+        self.input_script = None  # Replaces the keyboard when set
+        self.recorder = None
+        self.record_path = None
+        self.frame = 0  # Simulation steps taken
+        self.profiler = FrameProfiler()
 
         self.states = {
             "INTRO": IntroState(self),
@@ -1856,6 +3403,45 @@ class Game:
                 self.states["LEVEL_SELECT"] = LevelSelectState(self)
         self.current_state_name = name
         self.current_state = self.states[name]
+        self.current_state.redraw = True
+
+    def get_keys(self):
+        if self.input_script is not None:
+            return self.input_script.keys(self.frame)
+        if self.recorder is not None:
+            return self.recorder.keys
+        return pygame.key.get_pressed()
+
+    def step(self, events):
+        """Advance the simulation one fixed step with the input gathered for it"""
+        if self.input_script is not None:
+            events = self.input_script.events(self.frame)
+        elif self.recorder is not None:
+            events = self.recorder.capture(events, pygame.key.get_pressed())
+        self.current_state.handle_events(events)
+        self.profiler.lap("events")
+        self.current_state.update()
+        self.profiler.lap("other")
+        self.frame += 1
+        if self.recorder is not None and not isinstance(self.current_state, GameplayState):
+            # End the log on the step that left the level, not at the end of
+            # the rendered frame: later substeps would run in the menu
+            self.stop_recording()
+
+    def record(self, level_index, path, seed=0):
+        """Start level_index with a seeded simulation and log its input to path"""
+        SIM_RNG.seed(seed)
+        self.recorder = InputRecorder(level_index, seed)
+        self.record_path = path
+        self.frame = 0
+        self.start_level(level_index)
+
+    def stop_recording(self):
+        checksum = self.states["GAMEPLAY"].sim_checksum()
+        self.recorder.save(self.record_path, checksum)
+        print(f"Recorded {len(self.recorder.frames)} frames to {self.record_path} "
+              f"(checksum {checksum:08x})")
+        self.recorder = None
 
     def start_level(self, level_index):
         state = GameplayState(self, level_index)
@@ -1863,25 +3449,173 @@ class Game:
         self.current_state_name = "GAMEPLAY"
         self.current_state = state
 
+    def present(self, dirty):
+        """Show the frame: the dirty rects if few enough, else a full flip"""
+        if dirty is None:
+            pygame.display.flip()
+        elif dirty:
+            if sum(r.w * r.h for r in dirty) > DIRTY_MAX_AREA * SCREEN_WIDTH * SCREEN_HEIGHT:
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty)
+
     def run(self):
+        """Fixed-timestep loop: simulate at FPS, render as often as RENDER_FPS allows"""
         running = True
+        accumulator = 0.0
+        previous = time.perf_counter()
+        pending = []  # Events wait for the next simulation step
+        prof = self.profiler
         while running:
-            events = pygame.event.get()
-            for event in events:
+            now = time.perf_counter()
+            accumulator += now - previous
+            previous = now
+            prof.begin_frame()
+
+            for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    prof.toggle()  # Debug overlay; kept out of states and recordings
+                    continue
+                pending.append(event)
+            prof.lap("events")
+
+            steps = 0
+            while accumulator >= SIM_DT and steps < MAX_SUBSTEPS:
+                self.step(pending)
+                pending = []
+                accumulator -= SIM_DT
+                steps += 1
+            if steps == MAX_SUBSTEPS:
+                # Too far behind to catch up: let the game slow down instead
+                accumulator = min(accumulator, SIM_DT)
+
+            dirty = self.current_state.render(self.screen, accumulator / SIM_DT)
+            if prof.enabled:
+                prof.draw(self.screen)
+                self.current_state.redraw = True  # The overlay covers part of the frame
+                dirty = None
+            prof.lap("other")
+
+            self.present(dirty)
+            prof.lap("flip")
+            prof.end_frame()
+            self.clock.tick(self.current_state.render_rate())
+
+        if self.recorder is not None:
+            self.stop_recording()
+        pygame.quit()
+        sys.exit()
 
-            self.current_state.handle_events(events)
-            self.current_state.update()
+    def benchmark(self, level_index, frames, script=None, seed=0):
+        """Play a level for a number of simulated frames as fast as possible.
+
+        Input comes from script (ScriptedInput by default, or an InputReplay).
+        The level is restarted if it ends early. Returns update and render
+        ms/frame, overall frames/sec and the final simulation checksum.
+        """
+        self.input_script = script or ScriptedInput()
+        SIM_RNG.seed(seed)
+        self.frame = 0
+        self.start_level(level_index)
+        update_time = 0.0
+        render_time = 0.0
+        start = time.perf_counter()
+        for frame in range(frames):
+            if not isinstance(self.current_state, GameplayState):
+                self.start_level(level_index)  # Game over or course clear
+            pygame.event.pump()
+
+            t0 = time.perf_counter()
+            self.step([])
+            t1 = time.perf_counter()
             self.current_state.render(self.screen)
-
             pygame.display.flip()
-            self.clock.tick(FPS)
+            t2 = time.perf_counter()
+
+            update_time += t1 - t0
+            render_time += t2 - t1
+        elapsed = time.perf_counter() - start
+        self.input_script = None
+
+        return {
+            "level": LEVEL_DEFS[level_index]["name"],
+            "frames": frames,
+            "update_ms": update_time * 1000 / frames,
+            "render_ms": render_time * 1000 / frames,
+            "fps": frames / elapsed,
+            "checksum": self.states["GAMEPLAY"].sim_checksum(),
+        }
 
-        pygame.quit()
-        sys.exit()
+
+def main():
+    global PALETTE_RENDER
+    parser = argparse.ArgumentParser(description="Ultra Mario 3D N64 - Debug Build")
+    parser.add_argument("--bench", type=int, metavar="LEVEL",
+                        help="run LEVEL_DEFS[LEVEL] headless with scripted input and print timings")
+    parser.add_argument("--frames", type=int, default=1000,
+                        help="simulated frames for --bench (default 1000)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="play --level and record its input to FILE")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a recording headless and print timings")
+    parser.add_argument("--level", type=int, default=0,
+                        help="level index for --record (default 0)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="simulation seed for --record and --bench (default 0)")
+    parser.add_argument("--level-file", metavar="FILE", action="append", default=[],
+                        help="add a binary level after the built-in ones (repeatable)")
+    parser.add_argument("--export-levels", metavar="DIR",
+                        help="write every built-in level to DIR as binary level files and exit")
+    parser.add_argument("--palette", action="store_true",
+                        help="draw tiles and coins through the 8-bit palette-cycled path")
+    args = parser.parse_args()
+    if args.frames < 1:
+        parser.error("--frames must be at least 1")
+    if args.palette:
+        PALETTE_RENDER = True
+
+    if args.export_levels:
+        for path in export_levels(args.export_levels):
+            print(path)
+        return
+
+    for path in args.level_file:
+        index = add_level(load_level_file(path))
+        print(f"Level {index}: {LEVEL_DEFS[index]['name']} ({path})")
+
+    # Checked after --level-file, which adds levels
+    for option, level in (("--bench", args.bench), ("--level", args.level)):
+        if level is not None and not 0 <= level < len(LEVEL_DEFS):
+            parser.error(f"{option}: no level {level} (levels are 0-{len(LEVEL_DEFS) - 1})")
+
+    if args.record:
+        game = Game()
+        game.record(args.level, args.record, args.seed)
+        game.run()
+        return
+
+    if args.bench is None and args.replay is None:
+        Game().run()
+        return
+
+    game = Game(headless=True)
+    if args.replay:
+        replay = InputReplay(args.replay)
+        result = game.benchmark(replay.level_index, len(replay), replay, replay.seed)
+    else:
+        result = game.benchmark(args.bench, args.frames, seed=args.seed)
+    pygame.quit()
+    print(f"{result['level']}: {result['frames']} frames")
+    print(f"  update  {result['update_ms']:.3f} ms/frame")
+    print(f"  render  {result['render_ms']:.3f} ms/frame")
+    print(f"  overall {result['fps']:.1f} frames/sec")
+    print(f"  checksum {result['checksum']:08x}")
+    if args.replay and result["checksum"] != replay.checksum:
+        print(f"  MISMATCH: recording ended at checksum {replay.checksum:08x}")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    main()
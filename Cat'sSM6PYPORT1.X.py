@@ -1,6 +1,12 @@
 import pygame
 import math
 import sys
+from operator import attrgetter, itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only the z-buffer renderer needs it
+    np = None
 
 # ==========================================
 #  SUPER PYGAME 64 (Engine Rewrite)
@@ -19,6 +25,11 @@ SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
 FOV = 500 
+NEAR_PLANE = 1  # Vertices closer than this are behind the camera
+FAR_PLANE = 10000  # Objects further than this are not drawn
+# Frustum side planes: |x| <= FRUSTUM_X * z and |y| <= FRUSTUM_Y * z in camera space
+FRUSTUM_X = SCREEN_WIDTH / 2 / FOV
+FRUSTUM_Y = SCREEN_HEIGHT / 2 / FOV
 
 # Colors
 SKY_BLUE = (92, 148, 252)  # SM64 Sky
@@ -55,6 +66,12 @@ def rotate_y(x, z, angle_rad):
     nz = x * sin_a + z * cos_a
     return nx, nz
 
+def in_frustum(rx, ry, rz, radius):
+    """True if a sphere at camera-space center (rx, ry, rz) may be on screen."""
+    return (rz + radius > NEAR_PLANE and rz - radius < FAR_PLANE and
+            abs(rx) - FRUSTUM_X * rz < radius * math.hypot(1, FRUSTUM_X) and
+            abs(ry) - FRUSTUM_Y * rz < radius * math.hypot(1, FRUSTUM_Y))
+
 class Camera:
     def __init__(self, target):
         self.target = target
@@ -101,6 +118,81 @@ class Camera:
         dz = self.target.z - self.z
         return math.atan2(dx, dz)
 
+# --- Z-BUFFER RASTERIZER ---
+
+class ZBuffer:
+    """
+    Depth-tested rasterizer: fills convex polygons (the cube quads) into
+    NumPy color and depth buffers that are allocated once and reused every
+    frame, then copies the colors to the screen with surfarray. Buffers are
+    indexed [x, y]. The same class lives in sm64py.py; each script runs
+    on its own, so keep the two copies in step.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.color = np.zeros((width, height, 3), dtype=np.uint8)
+        self.inv_depth = np.zeros((width, height), dtype=np.float32)  # 1/z; 0 is infinitely far
+        # Pixel centers
+        self.px = np.arange(width, dtype=np.float32)[:, None] + 0.5
+        self.py = np.arange(height, dtype=np.float32)[None, :] + 0.5
+
+    def clear(self, color):
+        self.color[:] = color
+        self.inv_depth.fill(0)
+
+    def draw_polygon(self, points, depths, color):
+        """
+        Rasterizes a convex, planar polygon given its screen points and the
+        camera depth of each point, keeping only pixels nearer than what is
+        already in the buffer.
+        """
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        n = len(points)
+        # Twice the signed area (shoelace); its sign gives the winding
+        area = sum(xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in range(n))
+        if area == 0:
+            return
+        sign = 1 if area > 0 else -1
+
+        # Bounding box, clipped to the screen
+        x0 = max(min(xs), 0)
+        x1 = min(max(xs) + 1, self.width)
+        y0 = max(min(ys), 0)
+        y1 = min(max(ys) + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        px = self.px[x0:x1]
+        py = self.py[:, y0:y1]
+
+        # Inside every edge: each edge function is linear in x and y, so it is
+        # a column against a row, broadcast over the box
+        inside = None
+        for i in range(n):
+            ex, ey = xs[i - 1], ys[i - 1]
+            dx, dy = (xs[i] - ex) * sign, (ys[i] - ey) * sign
+            side = dx * py - (dx * ey - dy * ex) >= dy * px
+            inside = side if inside is None else inside & side
+
+        # 1/z is linear in screen space: fit its plane through three points
+        (ax, ay), (bx, by), (cx, cy) = points[:3]
+        az, bz, cz = (1 / z for z in depths[:3])
+        det = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        if det == 0:
+            return
+        kx = ((bz - az) * (cy - ay) - (by - ay) * (cz - az)) / det
+        ky = ((bx - ax) * (cz - az) - (bz - az) * (cx - ax)) / det
+        inv_z = kx * (px - ax) + (ky * (py - ay) + az)
+
+        depth = self.inv_depth[x0:x1, y0:y1]
+        nearer = inside & (inv_z > depth)
+        depth[nearer] = inv_z[nearer]
+        self.color[x0:x1, y0:y1][nearer] = color
+
+    def present(self, surface):
+        pygame.surfarray.blit_array(surface, self.color)
+
 # --- OBJECT CLASSES ---
 
 class Cube:
@@ -113,6 +205,30 @@ class Cube:
         
         # Render helpers
         self.half_size = size / 2
+        self.radius = self.half_size * math.sqrt(3)  # Bounding sphere
+        self.depth = 0  # Camera-space depth of the center, from the last get_screen_polygon
+
+        # World-space corners: built once here; only moving (non-static)
+        # cubes rebuild them, on frames where they have moved
+        self.world_verts = None
+        self.verts_pos = None  # Position world_verts were built at
+        self.get_world_verts()
+
+    def get_world_verts(self):
+        """The 8 corners in world space, front face first."""
+        pos = (self.x, self.y, self.z)
+        if self.world_verts is not None and (self.is_static or pos == self.verts_pos):
+            return self.world_verts
+
+        h = self.half_size
+        # Local offsets
+        local_verts = [
+            (-h, -h, -h), (h, -h, -h), (h, h, -h), (-h, h, -h), # Front
+            (-h, -h, h), (h, -h, h), (h, h, h), (-h, h, h)      # Back
+        ]
+        self.world_verts = [(self.x + lx, self.y + ly, self.z + lz) for lx, ly, lz in local_verts]
+        self.verts_pos = pos
+        return self.world_verts
 
     def get_screen_polygon(self, cam):
         """Calculates screen coordinates for the cube. Returns list of faces."""
@@ -126,30 +242,16 @@ class Cube:
         cam_yaw = cam.get_yaw()
         rx, rz = rotate_y(rel_x, rel_z, -cam_yaw)
         ry = rel_y
+        self.depth = rz
         
-        # Cull if behind camera
+        # Cull if behind camera, or outside the view frustum
         if rz <= 10: return []
+        if not in_frustum(rx, ry, rz, self.radius): return []
 
-        # 2. Generate Vertices (Local to object, then transformed)
+        # 2. Transform the cached world-space vertices
         h = self.half_size
-        # Local offsets
-        local_verts = [
-            (-h, -h, -h), (h, -h, -h), (h, h, -h), (-h, h, -h), # Front
-            (-h, -h, h), (h, -h, h), (h, h, h), (-h, h, h)      # Back
-        ]
-        
         proj_verts = []
-        for lx, ly, lz in local_verts:
-            # Rotate local vertex by SAME camera angle? 
-            # No, we translate object center, then add rotated local offsets.
-            # But for correct 3D rotation, we should rotate the absolute vertex positions.
-            # Optimized approach:
-            
-            # Absolute pos of vertex
-            vx = self.x + lx
-            vy = self.y + ly
-            vz = self.z + lz
-            
+        for vx, vy, vz in self.get_world_verts():
             # Rel to camera
             vrx = vx - cam.x
             vry = vy - cam.y
@@ -160,7 +262,7 @@ class Cube:
             rot_y = vry
             
             # Project
-            if rot_z < 1: 
+            if rot_z < NEAR_PLANE: 
                 proj_verts.append(None)
             else:
                 scale = FOV / rot_z
@@ -169,21 +271,28 @@ class Cube:
                 proj_verts.append((sx, sy, rot_z))
 
         # 3. Build Faces (Painter's Algo Prep)
+        # Vertex indices, shade, and outward normal (-y is up) for back-face culling
         faces = [
-            (0, 1, 2, 3, 1.0), # Front
-            (5, 4, 7, 6, 0.7), # Back
-            (4, 0, 3, 7, 0.8), # Left
-            (1, 5, 6, 2, 0.8), # Right
-            (4, 5, 1, 0, 1.2), # Top
-            (3, 2, 6, 7, 0.4), # Bottom
+            (0, 1, 2, 3, 1.0, (0, 0, -1)), # Front
+            (5, 4, 7, 6, 0.7, (0, 0, 1)),  # Back
+            (4, 0, 3, 7, 0.8, (-1, 0, 0)), # Left
+            (1, 5, 6, 2, 0.8, (1, 0, 0)),  # Right
+            (4, 5, 1, 0, 1.2, (0, -1, 0)), # Top
+            (3, 2, 6, 7, 0.4, (0, 1, 0)),  # Bottom
         ]
         
         render_faces = []
         for f in faces:
             p_indices = f[:4]
             shade = f[4]
+            nx, ny, nz = f[5]
+
+            # Back-face culling: skip faces whose outer side is turned away
+            if nx * -rel_x + ny * -rel_y + nz * -rel_z <= h:
+                continue
             
             points = []
+            depths = []
             avg_z = 0
             valid = True
             
@@ -192,6 +301,7 @@ class Cube:
                     valid = False
                     break
                 points.append((proj_verts[idx][0], proj_verts[idx][1]))
+                depths.append(proj_verts[idx][2])
                 avg_z += proj_verts[idx][2]
             
             if valid:
@@ -200,7 +310,7 @@ class Cube:
                 r = min(255, int(self.color[0] * shade))
                 g = min(255, int(self.color[1] * shade))
                 b = min(255, int(self.color[2] * shade))
-                render_faces.append({'z': avg_z, 'points': points, 'color': (r,g,b)})
+                render_faces.append({'z': avg_z, 'points': points, 'color': (r,g,b), 'depths': depths})
                 
         return render_faces
 
@@ -347,6 +457,13 @@ def main():
     platforms.append(Cube(300, -150, 0, 80, COIN_GOLD))
     platforms.append(Cube(450, -250, 0, 80, COIN_GOLD))
     
+    # TAB switches between the painter's algorithm and the z-buffer (needs NumPy)
+    zbuffer = ZBuffer(SCREEN_WIDTH, SCREEN_HEIGHT) if np is not None else None
+    use_zbuffer = False
+
+    # Everything drawn, kept in last frame's depth order (furthest first)
+    draw_order = platforms + [mario]
+
     running = True
     while running:
         # Event Handling
@@ -358,42 +475,51 @@ def main():
                     running = False
                 if event.key == pygame.K_r:
                     mario.respawn()
+                if event.key == pygame.K_TAB and zbuffer:
+                    use_zbuffer = not use_zbuffer
 
         # Update Logic
         mario.move(lakitu, platforms)
         lakitu.update()
 
-        # Rendering
-        screen.fill(SKY_BLUE)
-        
-        # Draw Floor Grid (Fake Horizon effect)
-        pygame.draw.rect(screen, (0, 100, 0), (0, SCREEN_HEIGHT/2, SCREEN_WIDTH, SCREEN_HEIGHT/2))
-
-        # Collect All Renderable Faces
+        # Collect All Renderable Faces (static geometry and Mario), object by
+        # object in last frame's depth order, so the queue is nearly sorted
         draw_queue = []
-        
-        # 1. Process Static Geometry
-        for p in platforms:
-            faces = p.get_screen_polygon(lakitu)
+        for obj in draw_order:
+            faces = obj.get_screen_polygon(lakitu)
             draw_queue.extend(faces)
-            
-        # 2. Process Mario
-        mario_faces = mario.get_screen_polygon(lakitu)
-        draw_queue.extend(mario_faces)
-        
-        # 3. Sort by Depth (Painter's Algorithm)
-        # Sort by Z (depth) descending (furthest first)
-        draw_queue.sort(key=lambda x: x['z'], reverse=True)
         
-        # 4. Draw
-        for face in draw_queue:
-            pts = face['points']
-            if len(pts) > 2:
-                pygame.draw.polygon(screen, face['color'], pts)
-                pygame.draw.polygon(screen, SHADOW_BLACK, pts, 1)
+        if use_zbuffer:
+            # 3. Z-Buffer: per-pixel depth test, no sorting needed
+            zbuffer.clear(SKY_BLUE)
+            zbuffer.color[:, SCREEN_HEIGHT // 2:] = (0, 100, 0)  # Fake horizon
+            for face in draw_queue:
+                zbuffer.draw_polygon(face['points'], face['depths'], face['color'])
+            zbuffer.present(screen)
+        else:
+            # Rendering
+            screen.fill(SKY_BLUE)
+
+            # Draw Floor Grid (Fake Horizon effect)
+            pygame.draw.rect(screen, (0, 100, 0), (0, SCREEN_HEIGHT/2, SCREEN_WIDTH, SCREEN_HEIGHT/2))
+
+            # 3. Sort by Depth (Painter's Algorithm)
+            # Sort by Z (depth) descending (furthest first). The queue arrives
+            # nearly sorted, which timsort handles in close to linear time;
+            # the objects are re-sorted the same way for next frame
+            draw_queue.sort(key=itemgetter('z'), reverse=True)
+            draw_order.sort(key=attrgetter('depth'), reverse=True)
+
+            # 4. Draw
+            for face in draw_queue:
+                pts = face['points']
+                if len(pts) > 2:
+                    pygame.draw.polygon(screen, face['color'], pts)
+                    pygame.draw.polygon(screen, SHADOW_BLACK, pts, 1)
 
         # UI / HUD
-        fps_text = font.render(f"FPS: {int(clock.get_fps())}", True, WHITE)
+        mode = "Z-BUFFER" if use_zbuffer else "PAINTER"
+        fps_text = font.render(f"FPS: {int(clock.get_fps())} | TAB: {mode}", True, WHITE)
         cam_text = font.render("ARROWS: Rotate Cam | WASD: Move | SPACE: Jump", True, WHITE)
         screen.blit(fps_text, (10, 10))
         screen.blit(cam_text, (10, 40))
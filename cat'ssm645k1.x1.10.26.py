@@ -76,6 +76,10 @@ class IntroState(GameState):
         self.parchment_surf = pygame.Surface((self.parchment_w, self.parchment_h))
         self._render_parchment_texture()
 
+        # Rendered once; only its alpha pulses each frame
+        prompt_font = pygame.font.SysFont("arial", 24, bold=True)
+        self.prompt = prompt_font.render("- PRESS START -", True, (80, 40, 0))
+
     def _render_parchment_texture(self):
         # 1. Fill background
         self.parchment_surf.fill(PARCHMENT)
@@ -160,8 +164,7 @@ class IntroState(GameState):
         
         # "Press Start" Pulse
         pulse = abs(math.sin(pygame.time.get_ticks() * 0.005)) * 255
-        prompt_font = pygame.font.SysFont("arial", 24, bold=True)
-        prompt = prompt_font.render("- PRESS START -", True, (80, 40, 0))
+        prompt = self.prompt
         prompt.set_alpha(int(pulse))
         
         prompt_x = SCREEN_WIDTH // 2 - prompt.get_width() // 2
@@ -1,6 +1,12 @@
 import pygame
 import math
 import sys
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it vertices are projected one by one
+    np = None
 
 # ==========================================
 #  PURE PYGAME 3D ENGINE (SOFTWARE RENDER)
@@ -17,6 +23,11 @@ SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 FPS = 60
 FOV = 400  # Field of View scale factor
+NEAR_PLANE = 1  # Vertices closer than this are behind the camera
+FAR_PLANE = 10000  # Objects further than this are not drawn
+# Frustum side planes: |x| <= FRUSTUM_X * z and |y| <= FRUSTUM_Y * z in camera space
+FRUSTUM_X = SCREEN_WIDTH / 2 / FOV
+FRUSTUM_Y = SCREEN_HEIGHT / 2 / FOV
 
 # Colors
 SKY_BLUE = (135, 206, 235)
@@ -28,6 +39,27 @@ GRAY = (128, 128, 128)    # Stone
 YELLOW = (255, 215, 0)    # Stars
 BLACK = (20, 20, 20)      # Shadow/Outline
 
+# Cube geometry: corners as multiples of the size, about the center
+# 0: Front-Top-Left, 1: Front-Top-Right, 2: Front-Bottom-Right, 3: Front-Bottom-Left
+# 4-7: Back equivalent
+CUBE_CORNERS = [
+    (-0.5, -0.5, -0.5), (0.5, -0.5, -0.5), (0.5, 0.5, -0.5), (-0.5, 0.5, -0.5),
+    (-0.5, -0.5, 0.5), (0.5, -0.5, 0.5), (0.5, 0.5, 0.5), (-0.5, 0.5, 0.5),
+]
+# Face definitions (indices of verts)
+CUBE_FACES = [
+    (0, 1, 2, 3), # Front
+    (5, 4, 7, 6), # Back
+    (4, 0, 3, 7), # Left
+    (1, 5, 6, 2), # Right
+    (4, 5, 1, 0), # Top
+    (3, 2, 6, 7), # Bottom
+]
+# Lighting shading factors (simple fake lighting)
+CUBE_SHADES = [1.0, 0.6, 0.8, 0.8, 1.2, 0.4] # Front, Back, Left, Right, Top, Bottom
+# Outward face normals, for back-face culling (-y is up)
+CUBE_NORMALS = [(0, 0, -1), (0, 0, 1), (-1, 0, 0), (1, 0, 0), (0, -1, 0), (0, 1, 0)]
+
 # Physics
 GRAVITY = 0.5
 JUMP_FORCE = -12
@@ -53,6 +85,21 @@ def rotate_y(x, z, angle):
     nz = x * sin_a + z * cos_a
     return nx, nz
 
+def camera_space(x, y, z, cam_x, cam_y, cam_z, cam_yaw):
+    """Translates and rotates world coordinates (numbers or arrays) into camera space."""
+    rx, rz = rotate_y(x - cam_x, z - cam_z, -cam_yaw)
+    return rx, y - cam_y, rz
+
+def in_frustum(rx, ry, rz, radius):
+    """
+    True if a sphere at camera-space center (rx, ry, rz) may be on screen,
+    tested against the near, far, left, right, top and bottom planes.
+    Works element-wise on NumPy arrays too.
+    """
+    return ((rz + radius > NEAR_PLANE) & (rz - radius < FAR_PLANE) &
+            (abs(rx) - FRUSTUM_X * rz < radius * math.hypot(1, FRUSTUM_X)) &
+            (abs(ry) - FRUSTUM_Y * rz < radius * math.hypot(1, FRUSTUM_Y)))
+
 def project(x, y, z, cam_x, cam_y, cam_z, cam_yaw):
     """
     Projects 3D world coordinates to 2D screen coordinates.
@@ -77,6 +124,21 @@ def project(x, y, z, cam_x, cam_y, cam_z, cam_yaw):
     
     return screen_x, screen_y, rz
 
+def project_batch(points, cam_x, cam_y, cam_z, cam_yaw):
+    """
+    project() for a whole array of points at once (last axis is x, y, z).
+    Returns (screen_x, screen_y, depth, in_front) arrays; screen coordinates
+    of points behind the camera are meaningless and in_front is False there.
+    """
+    rx, ry, rz = camera_space(points[..., 0], points[..., 1], points[..., 2],
+                              cam_x, cam_y, cam_z, cam_yaw)
+
+    in_front = rz > NEAR_PLANE
+    scale = FOV / np.where(in_front, rz, 1.0)
+    screen_x = (SCREEN_WIDTH / 2 + rx * scale).astype(int)
+    screen_y = (SCREEN_HEIGHT / 2 + ry * scale).astype(int)
+    return screen_x, screen_y, rz, in_front
+
 # --- CLASSES ---
 
 class Cube:
@@ -97,17 +159,27 @@ class Cube:
         self.grounded = False
 
         # Define 8 vertices relative to center
-        # We'll calculate absolute positions every frame for rendering
+        # Absolute positions are built once here; only moving (non-static)
+        # cubes rebuild them, on frames where they have moved
         self.half_size = size / 2
+        # Bounding sphere, for frustum culling
+        self.radius = math.sqrt(self.w**2 + self.h**2 + self.d**2) / 2
+        self.verts = None
+        self.verts_pos = None  # Position self.verts were built at
+        self.get_faces()
 
     def get_faces(self):
-        """Returns a list of faces. Each face is (avg_z, color, [points_2d])."""
+        """Returns (world-space vertices, face vertex indices, face shades)."""
+        pos = (self.x, self.y, self.z)
+        if self.verts is not None and (self.is_static or pos == self.verts_pos):
+            return self.verts, CUBE_FACES, CUBE_SHADES
+
         # Vertices (local space)
         # 0: Front-Top-Left, 1: Front-Top-Right, 2: Front-Bottom-Right, 3: Front-Bottom-Left
         # 4-7: Back equivalent
         hw, hh, hd = self.w/2, self.h/2, self.d/2
-        
-        verts = [
+
+        self.verts = [
             (self.x - hw, self.y - hh, self.z - hd), # 0
             (self.x + hw, self.y - hh, self.z - hd), # 1
             (self.x + hw, self.y + hh, self.z - hd), # 2
@@ -117,22 +189,14 @@ class Cube:
             (self.x + hw, self.y + hh, self.z + hd), # 6
             (self.x - hw, self.y + hh, self.z + hd), # 7
         ]
-        
-        # Face definitions (indices of verts)
-        # Order matters for simple backface culling (optional, but we stick to Painter's Algo)
-        face_indices = [
-            (0, 1, 2, 3), # Front
-            (5, 4, 7, 6), # Back
-            (4, 0, 3, 7), # Left
-            (1, 5, 6, 2), # Right
-            (4, 5, 1, 0), # Top
-            (3, 2, 6, 7), # Bottom
-        ]
+        self.verts_pos = pos
+        return self.verts, CUBE_FACES, CUBE_SHADES
 
-        # Lighting shading factors (simple fake lighting)
-        shades = [1.0, 0.6, 0.8, 0.8, 1.2, 0.4] # Front, Back, Left, Right, Top, Bottom
-
-        return verts, face_indices, shades
+    def faces_camera(self, face, cam_x, cam_y, cam_z):
+        """True if the camera is on the outer side of face (index into CUBE_FACES)."""
+        nx, ny, nz = CUBE_NORMALS[face]
+        return (nx * (cam_x - self.x) + ny * (cam_y - self.y) + nz * (cam_z - self.z) >
+                (abs(nx) * self.w + abs(ny) * self.h + abs(nz) * self.d) / 2)
 
     def get_aabb(self):
         """Returns (min_x, max_x, min_y, max_y, min_z, max_z)"""
@@ -233,6 +297,257 @@ class Player(Cube):
                         self.y = p_aabb[3] + self.h/2
                         self.vy = 0
 
+# --- RENDER PIPELINE ---
+
+class VertexBuffer:
+    """
+    World-space vertices of every cube in the scene, kept across frames in
+    one (objects, 8, 3) array. Static cubes are written once, at level setup;
+    moving ones are rewritten by update() only on frames they have moved.
+    Without NumPy it just holds the objects, and each Cube caches its own.
+    """
+    def __init__(self, objects):
+        self.objects = list(objects)
+        if np is None:
+            return
+        self.positions = [(obj.x, obj.y, obj.z) for obj in self.objects]
+        self.centers = np.array(self.positions, dtype=float)
+        self.sizes = np.array([(obj.w, obj.h, obj.d) for obj in self.objects], dtype=float)
+        self.colors = np.array([obj.color for obj in self.objects], dtype=float)
+        self.radii = np.array([obj.radius for obj in self.objects])
+        self.verts = self.centers[:, None, :] + self.sizes[:, None, :] * CORNERS
+        self.dynamic = [i for i, obj in enumerate(self.objects) if not obj.is_static]
+        # Stable per-object ids for face keys (id * 6 + face), unchanged by remove()
+        self.ids = np.arange(len(self.objects))
+        self.key_count = len(self.objects) * 6
+
+    def update(self):
+        """Rewrites the vertices of moving objects whose position changed."""
+        if np is None:
+            return
+        for i in self.dynamic:
+            obj = self.objects[i]
+            pos = (obj.x, obj.y, obj.z)
+            if pos != self.positions[i]:
+                self.positions[i] = pos
+                self.centers[i] = pos
+                self.verts[i] = self.centers[i] + self.sizes[i] * CORNERS
+
+    def remove(self, obj):
+        i = self.objects.index(obj)
+        del self.objects[i]
+        if np is None:
+            return
+        del self.positions[i]
+        self.centers = np.delete(self.centers, i, axis=0)
+        self.sizes = np.delete(self.sizes, i, axis=0)
+        self.colors = np.delete(self.colors, i, axis=0)
+        self.radii = np.delete(self.radii, i)
+        self.verts = np.delete(self.verts, i, axis=0)
+        self.ids = np.delete(self.ids, i)
+        self.dynamic = [j - (j > i) for j in self.dynamic if j != i]
+
+class DepthOrder:
+    """
+    Painter's order kept across frames. Faces go into the depth sort in last
+    frame's order, which the camera barely changes, so the stable sort
+    (timsort) mostly finds runs already in place and runs in near-linear time.
+    """
+    def __init__(self):
+        self.keys = []  # Face keys, furthest first, as drawn last frame
+
+    def sort(self, keys, avg_z, key_count):
+        """Indices that put this frame's faces furthest first."""
+        slot = np.full(key_count, -1)
+        slot[keys] = np.arange(len(keys))
+        # Faces still visible, in last frame's order, then the newly visible ones
+        seq = slot[self.keys]
+        seq = seq[seq >= 0]
+        new = np.ones(len(keys), dtype=bool)
+        new[seq] = False
+        seq = np.concatenate((seq, np.flatnonzero(new)))
+
+        seq = seq[np.argsort(-avg_z[seq], kind='stable')]
+        self.keys = keys[seq]
+        return seq
+
+def build_render_list(scene, cam_x, cam_y, cam_z, cam_yaw, depth_order=None):
+    """
+    Project the faces of every object in a VertexBuffer.
+    Returns a list of (avg_depth, [points], color, [point depths]),
+    furthest first (painter's order) if a DepthOrder is given.
+    """
+    if np is None:
+        return build_render_list_scalar(scene.objects, cam_x, cam_y, cam_z, cam_yaw,
+                                        depth_order is not None)
+
+    # Frustum culling: drop whole objects before any vertex is projected
+    rx, ry, rz = camera_space(scene.centers[:, 0], scene.centers[:, 1], scene.centers[:, 2],
+                              cam_x, cam_y, cam_z, cam_yaw)
+    keep = in_frustum(rx, ry, rz, scene.radii)
+    centers, sizes, colors = scene.centers[keep], scene.sizes[keep], scene.colors[keep]
+
+    # Cached world-space vertices of the remaining objects: (objects, 8, 3)
+    verts = scene.verts[keep]
+    screen_x, screen_y, depth, in_front = project_batch(verts, cam_x, cam_y, cam_z, cam_yaw)
+
+    # Gather per face through the shared index array: (objects, 6, 4)
+    # We only draw a face if ALL 4 points are in front, and it faces the camera
+    facing = (np.array((cam_x, cam_y, cam_z)) - centers) @ NORMALS.T > sizes @ abs(NORMALS).T / 2
+    visible = in_front[:, FACE_INDEX].all(axis=2) & facing
+    obj_idx, face_idx = np.nonzero(visible)
+    corners = FACE_INDEX[face_idx]
+    points = np.stack((screen_x[obj_idx[:, None], corners],
+                       screen_y[obj_idx[:, None], corners]), axis=2)
+    depths = depth[obj_idx[:, None], corners]
+    avg_z = depths.sum(axis=1) / 4
+
+    # Apply shading
+    shaded = np.clip(colors[obj_idx] * SHADES[face_idx, None], 0, 255).astype(int)
+
+    if depth_order is not None:
+        # Depth sort on the arrays, before anything becomes a Python list
+        keys = scene.ids[keep][obj_idx] * 6 + face_idx
+        order = depth_order.sort(keys, avg_z, scene.key_count)
+        avg_z, points, shaded, depths = avg_z[order], points[order], shaded[order], depths[order]
+
+    return list(zip(avg_z.tolist(), points.tolist(), map(tuple, shaded.tolist()),
+                    depths.tolist()))
+
+def build_render_list_scalar(objects, cam_x, cam_y, cam_z, cam_yaw, ordered=False):
+    """build_render_list without NumPy: one project() call per vertex."""
+    render_list = []
+    for obj in objects:
+        # Frustum culling: skip whole objects before any vertex is projected
+        if not in_frustum(*camera_space(obj.x, obj.y, obj.z, cam_x, cam_y, cam_z, cam_yaw),
+                          obj.radius):
+            continue
+
+        verts, faces, shades = obj.get_faces()
+
+        # Project all vertices first
+        proj_verts = []
+        for v in verts:
+            p = project(v[0], v[1], v[2], cam_x, cam_y, cam_z, cam_yaw)
+            proj_verts.append(p)
+
+        # Process faces
+        for i, face_idxs in enumerate(faces):
+            # Back-face culling
+            if not obj.faces_camera(i, cam_x, cam_y, cam_z):
+                continue
+
+            # Get projected points for this face
+            face_points_2d = []
+            face_depths = []
+            avg_z = 0
+            valid_point_count = 0
+
+            for idx in face_idxs:
+                p = proj_verts[idx]
+                if p:
+                    face_points_2d.append((p[0], p[1]))
+                    face_depths.append(p[2])
+                    avg_z += p[2]
+                    valid_point_count += 1
+
+            # If any point is behind camera (None), or too close, we might skip
+            # For this simple engine, we only draw if ALL 4 points are in front
+            if valid_point_count == 4:
+                avg_z /= 4
+
+                # Apply shading
+                base_color = obj.color
+                shade_factor = shades[i]
+                r = max(0, min(255, int(base_color[0] * shade_factor)))
+                g = max(0, min(255, int(base_color[1] * shade_factor)))
+                b = max(0, min(255, int(base_color[2] * shade_factor)))
+
+                render_list.append((avg_z, face_points_2d, (r, g, b), face_depths))
+
+    if ordered:
+        render_list.sort(key=itemgetter(0), reverse=True)
+    return render_list
+
+class ZBuffer:
+    """
+    Depth-tested rasterizer: fills convex polygons (the cube quads) into
+    NumPy color and depth buffers that are allocated once and reused every
+    frame, then copies the colors to the screen with surfarray. Buffers are
+    indexed [x, y]. The same class lives in Cat'sSM6PYPORT1.X.py; each script runs
+    on its own, so keep the two copies in step.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.color = np.zeros((width, height, 3), dtype=np.uint8)
+        self.inv_depth = np.zeros((width, height), dtype=np.float32)  # 1/z; 0 is infinitely far
+        # Pixel centers
+        self.px = np.arange(width, dtype=np.float32)[:, None] + 0.5
+        self.py = np.arange(height, dtype=np.float32)[None, :] + 0.5
+
+    def clear(self, color):
+        self.color[:] = color
+        self.inv_depth.fill(0)
+
+    def draw_polygon(self, points, depths, color):
+        """
+        Rasterizes a convex, planar polygon given its screen points and the
+        camera depth of each point, keeping only pixels nearer than what is
+        already in the buffer.
+        """
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        n = len(points)
+        # Twice the signed area (shoelace); its sign gives the winding
+        area = sum(xs[i - 1] * ys[i] - xs[i] * ys[i - 1] for i in range(n))
+        if area == 0:
+            return
+        sign = 1 if area > 0 else -1
+
+        # Bounding box, clipped to the screen
+        x0 = max(min(xs), 0)
+        x1 = min(max(xs) + 1, self.width)
+        y0 = max(min(ys), 0)
+        y1 = min(max(ys) + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        px = self.px[x0:x1]
+        py = self.py[:, y0:y1]
+
+        # Inside every edge: each edge function is linear in x and y, so it is
+        # a column against a row, broadcast over the box
+        inside = None
+        for i in range(n):
+            ex, ey = xs[i - 1], ys[i - 1]
+            dx, dy = (xs[i] - ex) * sign, (ys[i] - ey) * sign
+            side = dx * py - (dx * ey - dy * ex) >= dy * px
+            inside = side if inside is None else inside & side
+
+        # 1/z is linear in screen space: fit its plane through three points
+        (ax, ay), (bx, by), (cx, cy) = points[:3]
+        az, bz, cz = (1 / z for z in depths[:3])
+        det = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        if det == 0:
+            return
+        kx = ((bz - az) * (cy - ay) - (by - ay) * (cz - az)) / det
+        ky = ((bx - ax) * (cz - az) - (bz - az) * (cx - ax)) / det
+        inv_z = kx * (px - ax) + (ky * (py - ay) + az)
+
+        depth = self.inv_depth[x0:x1, y0:y1]
+        nearer = inside & (inv_z > depth)
+        depth[nearer] = inv_z[nearer]
+        self.color[x0:x1, y0:y1][nearer] = color
+
+    def present(self, surface):
+        pygame.surfarray.blit_array(surface, self.color)
+
+if np is not None:
+    CORNERS = np.array(CUBE_CORNERS)
+    FACE_INDEX = np.array(CUBE_FACES)
+    SHADES = np.array(CUBE_SHADES)
+    NORMALS = np.array(CUBE_NORMALS)
+
 # --- MAIN GAME LOOP ---
 
 def main():
@@ -252,15 +567,23 @@ def main():
     platforms.append(Cube(0, -150, 300, 150, GRAY))
     
     stars = []
-    stars.append(Cube(500, -200, 0, 30, YELLOW)) # Star on top of steps
-    stars.append(Cube(0, -250, 300, 30, YELLOW)) # Star on floating plat
+    stars.append(Cube(500, -200, 0, 30, YELLOW, is_static=False)) # Star on top of steps
+    stars.append(Cube(0, -250, 300, 30, YELLOW, is_static=False)) # Star on floating plat
+
+    # World-space vertices: the platforms' are frozen here, the rest follow them
+    scene = VertexBuffer(platforms + stars + [player])
     
     camera_x, camera_y, camera_z = 0, -200, -600
     camera_yaw = 0
     target_yaw = 0
     
     score = 0
-    
+
+    # TAB switches between the painter's algorithm and the z-buffer (needs NumPy)
+    zbuffer = ZBuffer(SCREEN_WIDTH, SCREEN_HEIGHT) if np is not None else None
+    use_zbuffer = False
+    depth_order = DepthOrder()
+
     running = True
     while running:
         # 1. Event Handling
@@ -270,7 +593,9 @@ def main():
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     running = False
-                    
+                if event.key == pygame.K_TAB and zbuffer:
+                    use_zbuffer = not use_zbuffer
+
         # Camera Control
         keys = pygame.key.get_pressed()
         if keys[pygame.K_LEFT]: target_yaw -= 3
@@ -321,6 +646,7 @@ def main():
                 p_aabb[2] < s_aabb[3] and p_aabb[3] > s_aabb[2] and
                 p_aabb[4] < s_aabb[5] and p_aabb[5] > s_aabb[4]):
                 stars.remove(s)
+                scene.remove(s)
                 score += 1
                 print("Star Collected!")
 
@@ -340,64 +666,33 @@ def main():
         camera_y += (desired_cam_y - camera_y) * 0.05
 
         # 3. Rendering (The 3D Pipeline)
-        screen.fill(SKY_BLUE)
-        
         # Floor Grid (Visual Trick for orientation)
         # Draw a big rectangle for "horizon" or ground at bottom
         # pygame.draw.rect(screen, (50, 150, 50), (0, SCREEN_HEIGHT/2, SCREEN_WIDTH, SCREEN_HEIGHT/2))
 
         # Collect all faces from all objects to render
-        render_list = [] # Stores (avg_depth, [points], color)
-        
-        all_objects = platforms + stars + [player]
-        
-        for obj in all_objects:
-            verts, faces, shades = obj.get_faces()
-            
-            # Project all vertices first
-            proj_verts = []
-            for v in verts:
-                p = project(v[0], v[1], v[2], camera_x, camera_y, camera_z, camera_yaw)
-                proj_verts.append(p)
-                
-            # Process faces
-            for i, face_idxs in enumerate(faces):
-                # Get projected points for this face
-                face_points_2d = []
-                avg_z = 0
-                valid_point_count = 0
-                
-                for idx in face_idxs:
-                    p = proj_verts[idx]
-                    if p:
-                        face_points_2d.append((p[0], p[1]))
-                        avg_z += p[2]
-                        valid_point_count += 1
-                
-                # If any point is behind camera (None), or too close, we might skip
-                # For this simple engine, we only draw if ALL 4 points are in front
-                if valid_point_count == 4:
-                    avg_z /= 4
-                    
-                    # Apply shading
-                    base_color = obj.color
-                    shade_factor = shades[i]
-                    r = max(0, min(255, int(base_color[0] * shade_factor)))
-                    g = max(0, min(255, int(base_color[1] * shade_factor)))
-                    b = max(0, min(255, int(base_color[2] * shade_factor)))
-                    
-                    render_list.append((avg_z, face_points_2d, (r, g, b)))
-
-        # PAINTER'S ALGORITHM: Sort by depth (furthest first)
-        render_list.sort(key=lambda x: x[0], reverse=True)
-        
-        # Draw Faces
-        for depth, poly, col in render_list:
-            pygame.draw.polygon(screen, col, poly)
-            pygame.draw.polygon(screen, BLACK, poly, 1) # Wireframe outline for definition
+        scene.update()
+        # The painter's algorithm needs them furthest first; the z-buffer doesn't
+        render_list = build_render_list(scene, camera_x, camera_y, camera_z, camera_yaw,
+                                        None if use_zbuffer else depth_order)
+
+        if use_zbuffer:
+            # Z-BUFFER: per-pixel depth test, no sorting needed
+            zbuffer.clear(SKY_BLUE)
+            for depth, poly, col, depths in render_list:
+                zbuffer.draw_polygon(poly, depths, col)
+            zbuffer.present(screen)
+        else:
+            # PAINTER'S ALGORITHM: render_list is already sorted by depth (furthest first)
+            # Draw Faces
+            screen.fill(SKY_BLUE)
+            for depth, poly, col, depths in render_list:
+                pygame.draw.polygon(screen, col, poly)
+                pygame.draw.polygon(screen, BLACK, poly, 1) # Wireframe outline for definition
 
         # HUD
-        score_text = font.render(f"STARS: {score}  |  WASD+SPACE to Move  |  ARROWS to Rotate Cam", True, BLACK)
+        mode = "Z-BUFFER" if use_zbuffer else "PAINTER"
+        score_text = font.render(f"STARS: {score}  |  WASD+SPACE to Move  |  ARROWS to Rotate Cam  |  TAB: {mode}", True, BLACK)
         screen.blit(score_text, (20, 20))
 
         pygame.display.flip()